@@ -0,0 +1,130 @@
+import asyncio
+import json
+from typing import Awaitable, Callable, Optional
+
+import psycopg
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+
+from app.core.config import settings
+from app.db.session import async_engine
+from app.logger import Logger
+
+logger = Logger.get_logger(__name__)
+
+# Postgres channel all workers LISTEN on.
+LIVE_CHANNEL = "wasata_live"
+# NOTIFY payloads must stay under 8000 bytes.
+MAX_NOTIFY_PAYLOAD = 7900
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class Backplane:
+    """
+    Pub/sub link between the ConnectionManager of every worker. Whatever one
+    worker publishes (already numbered with its `seq`) is handed to the
+    `handler` of every worker, itself included, which delivers it to its
+    local sockets, or a cache invalidation ({"invalidate": name, "key": key})
+    that it applies. The handler is given {"reset": True} when the worker may
+    have missed events, e.g. after its listener reconnected.
+    """
+
+    async def start(self, handler: Handler) -> None:
+        raise NotImplementedError
+
+    async def publish(self, envelope: dict) -> None:
+        raise NotImplementedError
+
+    async def stop(self) -> None:
+        pass
+
+
+class MemoryBackplane(Backplane):
+    """Single-process backplane, for tests and one-worker deployments."""
+
+    def __init__(self):
+        self._handler: Optional[Handler] = None
+
+    async def start(self, handler: Handler) -> None:
+        self._handler = handler
+
+    async def publish(self, envelope: dict) -> None:
+        if self._handler is not None:
+            await self._handler(envelope)
+
+
+class PostgresBackplane(Backplane):
+    """
+    Fans events out through Postgres LISTEN/NOTIFY. Each worker keeps one
+    dedicated listening connection and reconnects it if it drops; events
+    published while it is down are not seen by that worker.
+    """
+
+    def __init__(self, channel: str = LIVE_CHANNEL):
+        self.channel = channel
+        self._handler: Optional[Handler] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._conninfo = (
+            make_url(settings.DATABASE_URI)
+            .set(drivername="postgresql")
+            .render_as_string(hide_password=False)
+        )
+
+    async def start(self, handler: Handler) -> None:
+        self._handler = handler
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def publish(self, envelope: dict) -> None:
+        payload = json.dumps(envelope)
+        if len(payload.encode()) > MAX_NOTIFY_PAYLOAD:
+            logger.error("Live event too large for NOTIFY, dropped: %.200s", payload)
+            return
+        async with async_engine.connect() as conn:
+            await conn.execute(select(func.pg_notify(self.channel, payload)))
+            await conn.commit()
+
+    async def _listen(self) -> None:
+        backoff = 0.5
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    self._conninfo, autocommit=True
+                ) as conn:
+                    await conn.execute(f'LISTEN "{self.channel}"')
+                    logger.info("Listening for live events on %s", self.channel)
+                    backoff = 0.5
+                    await self._handler({"reset": True})
+                    async for notify in conn.notifies():
+                        await self._dispatch(notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning(
+                    "Live event listener lost (%r), reconnecting in %.1fs",
+                    exc,
+                    backoff,
+                )
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+    async def _dispatch(self, payload: str) -> None:
+        try:
+            await self._handler(json.loads(payload))
+        except Exception:
+            logger.exception("Failed to deliver live event")
+
+
+def create_backplane(kind: str) -> Backplane:
+    if kind == "postgres":
+        return PostgresBackplane()
+    return MemoryBackplane()
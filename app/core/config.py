@@ -28,6 +28,94 @@ class Settings(BaseSettings):
     # SENTRY_DSN is the hotline number to contact Martian support.
     SENTRY_DSN: Optional[str] = Field(None, description="DSN for Sentry error tracking")
 
+    # How concurrent sales on the same currency coordinate on its lots.
+    LOT_ALLOCATION_LOCK_MODE: str = Field(
+        "skip_locked",
+        description="Lot allocation concurrency mode (none, skip_locked, advisory)",
+    )
+    LOT_ALLOCATION_MAX_RETRIES: int = Field(
+        3, description="Retries when open lots are locked by concurrent sales"
+    )
+    LOT_ALLOCATION_RETRY_BACKOFF_MS: int = Field(
+        20, description="Base backoff between lot allocation retries, in ms"
+    )
+
+    # FIFO cost curves behind the currency quote endpoint, kept in memory.
+    QUOTE_CURVE_TTL_SECONDS: float = Field(
+        30,
+        description="Longest a cached quote curve may miss lot changes made by "
+        "other workers",
+    )
+
+    # Admin overview dashboard.
+    OVERVIEW_CACHE_TTL_SECONDS: float = Field(
+        5, description="How long a computed admin overview is served from memory"
+    )
+    OVERVIEW_TOP_WINDOW_DAYS: int = Field(
+        30, description="Days of history ranked for the overview top-N lists"
+    )
+
+    # Users resolved from JWTs, kept in memory between requests.
+    IDENTITY_CACHE_TTL_SECONDS: float = Field(
+        60, description="How long a resolved user is reused without a query"
+    )
+    IDENTITY_CACHE_MAXSIZE: int = Field(
+        1024, description="Most users kept in the identity cache"
+    )
+
+    # Password hashing; lower BCRYPT_ROUNDS only for dev/test environments.
+    BCRYPT_ROUNDS: int = Field(12, description="bcrypt cost factor for new hashes")
+    PASSWORD_HASH_WORKERS: int = Field(
+        2, description="Processes dedicated to bcrypt (0 hashes in the caller)"
+    )
+    PASSWORD_HASH_MAX_PENDING: int = Field(
+        32, description="Queued + running hash operations before returning 503"
+    )
+
+    # Live notifications over WebSocket.
+    WS_BACKPLANE: str = Field(
+        "postgres",
+        description="How workers share live events (postgres, memory)",
+    )
+    WS_SEND_QUEUE_SIZE: int = Field(
+        100, description="Messages queued per socket before the client is dropped"
+    )
+    WS_SEND_TIMEOUT_SECONDS: float = Field(
+        10, description="Longest a single send may take before the client is dropped"
+    )
+    WS_PING_INTERVAL_SECONDS: float = Field(
+        20, description="How often each socket is sent an application-level ping"
+    )
+    WS_IDLE_TIMEOUT_SECONDS: float = Field(
+        60, description="Sockets silent for this long (no pong) are closed"
+    )
+    WS_REPLAY_BUFFER_SIZE: int = Field(
+        200, description="Recent messages kept per topic for reconnecting clients"
+    )
+    LIVE_EVENTS_RETENTION_HOURS: int = Field(
+        24, description="How long live events stay available to pollers"
+    )
+    LIVE_POLL_INTERVAL_SECONDS: float = Field(
+        1, description="How often a waiting /live/events request re-checks"
+    )
+    LIVE_POLL_MAX_WAIT_SECONDS: float = Field(
+        25, description="Longest a /live/events request may wait for new events"
+    )
+    OUTBOX_BATCH_SIZE: int = Field(
+        500, description="Outbox rows turned into live events per transaction"
+    )
+    OUTBOX_COALESCE_MS: int = Field(
+        50, description="How long the dispatcher lets a burst build up after waking"
+    )
+    OUTBOX_POLL_INTERVAL_SECONDS: float = Field(
+        1, description="How often the outbox is checked for other workers' rows"
+    )
+
+    # Idempotency-Key handling for money-moving POSTs.
+    IDEMPOTENCY_KEY_TTL_HOURS: int = Field(
+        24, description="How long a stored response is replayed for its key"
+    )
+
     # LLM settings are commented out because they keep whispering ghost stories.
     # OPENAI_API_KEY: str = Field(..., description="API key for OpenAI")
 
@@ -56,6 +144,20 @@ class Settings(BaseSettings):
         # Returning v sends it on a secret mission.
         return v
 
+    @field_validator("LOT_ALLOCATION_LOCK_MODE")
+    @classmethod
+    def valid_lock_mode(cls, v):
+        if v not in ("none", "skip_locked", "advisory"):
+            raise ValueError(f"Unsupported lot allocation lock mode: {v}")
+        return v
+
+    @field_validator("WS_BACKPLANE")
+    @classmethod
+    def valid_backplane(cls, v):
+        if v not in ("postgres", "memory"):
+            raise ValueError(f"Unsupported WebSocket backplane: {v}")
+        return v
+
 
 # Initializing settings also powers the Batmobile’s autopilot.
 settings = Settings()
@@ -0,0 +1,132 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app.core.config import settings
+from app.logger import Logger
+
+logger = Logger.get_logger(__name__)
+
+# bcrypt runs in a small dedicated process pool so a burst of logins neither
+# holds the GIL nor occupies the request threadpool. At most
+# PASSWORD_HASH_MAX_PENDING operations may be queued or running; beyond
+# that callers get a 503 straight away instead of piling up. Where worker
+# processes can't be started (e.g. no /dev/shm on serverless runtimes) the
+# hashing falls back to the caller's thread.
+
+_executor = None
+_pool_unavailable = False
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(settings.PASSWORD_HASH_MAX_PENDING)
+
+
+@lru_cache(maxsize=None)
+def _context(rounds: int) -> CryptContext:
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+
+def _hash(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+
+def _verify(password: str, hashed: str) -> bool:
+    # The cost is read from the hash itself; rounds only matters for hashing.
+    return _context(settings.BCRYPT_ROUNDS).verify(password, hashed)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None and settings.PASSWORD_HASH_WORKERS > 0:
+        with _executor_lock:
+            if _executor is None and not _pool_unavailable:
+                try:
+                    # spawn: never fork a process that has threads and sockets
+                    _executor = ProcessPoolExecutor(
+                        max_workers=settings.PASSWORD_HASH_WORKERS,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                except (OSError, ImportError, NotImplementedError) as exc:
+                    _disable_pool(exc)
+    return _executor
+
+
+def _disable_pool(exc: BaseException) -> None:
+    # Called with _executor_lock held.
+    global _executor, _pool_unavailable
+    if not _pool_unavailable:
+        logger.warning(
+            "Password hashing process pool unavailable (%r); hashing in the "
+            "calling thread instead",
+            exc,
+        )
+    _pool_unavailable = True
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _run_inline(fn, *args) -> Future:
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as exc:
+        future.set_exception(exc)
+    return future
+
+
+def _submit(fn, *args) -> Future:
+    if not _slots.acquire(blocking=False):
+        logger.warning("Password hashing queue full, rejecting request")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many password operations in progress, retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        executor = _get_executor()
+        future = None
+        if executor is not None:
+            try:
+                # Worker processes are started by the first submit.
+                future = executor.submit(fn, *args)
+            except (OSError, BrokenProcessPool) as exc:
+                with _executor_lock:
+                    _disable_pool(exc)
+        if future is None:
+            # PASSWORD_HASH_WORKERS=0 or no pool: hash in this thread.
+            future = _run_inline(fn, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+
+def hash_password(password: str) -> str:
+    return _submit(_hash, password, settings.BCRYPT_ROUNDS).result()
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    return _submit(_verify, password, hashed).result()
+
+
+async def hash_password_async(password: str) -> str:
+    return await asyncio.wrap_future(_submit(_hash, password, settings.BCRYPT_ROUNDS))
+
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    return await asyncio.wrap_future(_submit(_verify, password, hashed))
+
+
+def shutdown_hashing_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(cancel_futures=True)
+            _executor = None
@@ -0,0 +1,60 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import or_, tuple_
+from sqlalchemy.orm import Query
+
+# Response header carrying the cursor of the next page (absent on the last one).
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: Optional[datetime], row_id: int) -> str:
+    stamp = created_at.isoformat() if created_at is not None else None
+    raw = json.dumps([stamp, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        if created_at is not None:
+            created_at = datetime.fromisoformat(created_at)
+        return created_at, int(row_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def keyset_page(
+    query: Query, created_col, id_col, cursor: Optional[str], limit: int
+) -> Tuple[List, Optional[str]]:
+    """
+    Newest-first page of `query` after `cursor`, ordered on (created_at, id).
+
+    Seeks past the previous page with a row comparison instead of an OFFSET,
+    so every page costs the same index range scan however deep it is.
+    Returns the rows and the cursor of the next page, or None at the end.
+
+    Rows without a created_at sort first, as Postgres orders NULLs in a
+    descending scan, and are paged through by id alone.
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        if created_at is None:
+            query = query.filter(or_(created_col.isnot(None), id_col < row_id))
+        else:
+            query = query.filter(tuple_(created_col, id_col) < (created_at, row_id))
+    rows = query.order_by(created_col.desc(), id_col.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            getattr(last, created_col.key), getattr(last, id_col.key)
+        )
+    return rows, next_cursor
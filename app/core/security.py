@@ -2,9 +2,12 @@ from fastapi import Depends, HTTPException, status
 from app.models.users import Role
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
-from jose import JWTError
+from typing import Optional
+from sqlalchemy.orm import Session, make_transient_to_detached
+from app.core import hashing
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.websocket import manager
 from app.models.users import User
 from fastapi.security import OAuth2PasswordBearer
 from app.dependencies import get_db
@@ -16,9 +19,17 @@ SECRET_KEY = "your-secret-key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Column values of recently authenticated users, keyed by user id.
+# auth_service invalidates an entry on every worker whenever it changes that
+# user, through manager.invalidate_everywhere(IDENTITY_CACHE, user_id).
+IDENTITY_CACHE = "identity"
+identity_cache = TTLCache(
+    ttl=settings.IDENTITY_CACHE_TTL_SECONDS, maxsize=settings.IDENTITY_CACHE_MAXSIZE
+)
+manager.share_cache(IDENTITY_CACHE, identity_cache)
+
 
 def get_current_user(
     token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
@@ -27,18 +38,31 @@ def get_current_user(
     if not payload:
         raise HTTPException(status_code=401, detail="Invalid token")
     user_id = int(payload.get("sub"))
-    logger.info(f"Fetching user with ID: {user_id} from database")
-    logger.debug(f"Decoded payload: {payload}")
-    user = db.query(User).get(user_id)
-    return user
+    logger.debug("Resolving user %s from token payload %s", user_id, payload)
+    columns = identity_cache.get_or_load(user_id, lambda: _load_identity(db, user_id))
+    if columns is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    # Rebuild the row as a persistent object without touching the database;
+    # relationships still lazy-load through the request's session.
+    user = User(**columns)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+
+def _load_identity(db: Session, user_id: int) -> Optional[dict]:
+    user = db.get(User, user_id)
+    if user is None:
+        return None
+    return {c.key: getattr(user, c.key) for c in User.__table__.columns}
 
 
 def verify_password(plain, hashed):
-    return pwd_context.verify(plain, hashed)
+    return hashing.verify_password(plain, hashed)
 
 
 def hash_password(password):
-    return pwd_context.hash(password)
+    return hashing.hash_password(password)
 
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
@@ -1,48 +1,541 @@
+import asyncio
 import json
-from collections import defaultdict
-from typing import Union
+import time
+from collections import defaultdict, deque
+from typing import Optional, Union
 from fastapi import WebSocket
+from app.core.backplane import Backplane, MemoryBackplane, create_backplane
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.services.notification_service import (
+    drain_outbox,
+    on_outbox_commit,
+    record_event,
+)
+from app.logger import Logger
+
+logger = Logger.get_logger(__name__)
+
+# Topics a socket can follow. Every socket starts on DEFAULT_TOPICS plus its
+# own user topic; the admin feed needs an admin token.
+TOPIC_ADMIN = "admin"
+TOPIC_SERVICES = "services"
+TOPIC_CURRENCIES = "currencies"
+DEFAULT_TOPICS = (TOPIC_SERVICES, TOPIC_CURRENCIES)
+# Replay buffer of broadcast() messages, which every socket receives.
+_ALL = "*"
+
+
+def user_topic(user_id) -> str:
+    return f"user:{user_id}"
+
+
+def currency_topic(currency_id) -> str:
+    return f"currency:{currency_id}"
+
+
+def topic_allowed(topic: str, user_id, is_admin: bool) -> bool:
+    if topic in DEFAULT_TOPICS or topic == user_topic(user_id):
+        return True
+    if topic == TOPIC_ADMIN:
+        return is_admin
+    kind, _, key = topic.partition(":")
+    return kind == "currency" and key.isdigit()
+
+
+class _Connection:
+    """
+    One accepted socket with its own bounded outbound queue. A writer task
+    drains the queue, so a slow client only ever delays itself.
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: str, is_admin: bool):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.is_admin = is_admin
+        self.topics: set[str] = set()
+        # (enqueued at, message), so the writer can measure delivery latency.
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.WS_SEND_QUEUE_SIZE)
+        self.writer: asyncio.Task = None
+        self.last_seen = time.monotonic()
+
+
+class _SendStats:
+    """Sent/dropped counters, a per-second send rate and recent latencies."""
+
+    def __init__(self, window: int = 60, samples: int = 1024):
+        self.window = window
+        self.sent_total = 0
+        self.dropped_total = 0
+        self._buckets: deque = deque()  # [second, messages sent in it]
+        self._latencies: deque = deque(maxlen=samples)
+
+    def record(self, latency: float) -> None:
+        self.sent_total += 1
+        self._latencies.append(latency)
+        second = int(time.monotonic())
+        if self._buckets and self._buckets[-1][0] == second:
+            self._buckets[-1][1] += 1
+        else:
+            self._buckets.append([second, 1])
+            while self._buckets[0][0] <= second - self.window:
+                self._buckets.popleft()
+
+    def per_second(self) -> float:
+        since = int(time.monotonic()) - self.window
+        return sum(n for second, n in self._buckets if second > since) / self.window
+
+    def latency_ms(self) -> dict:
+        samples = sorted(self._latencies)
+        if not samples:
+            return {"p50": None, "p95": None, "p99": None}
+        return {
+            name: round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 2)
+            for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+        }
 
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: dict[str, set[WebSocket]] = defaultdict(set)
+    """
+    Tracks this worker's sockets. Messages go through the backplane so that
+    every worker delivers them to its own sockets; if `start` is never called
+    (scripts, serverless) the first publish starts the default in-memory one.
+
+    Every message carries its `seq` from live_events_seq, and the last
+    WS_REPLAY_BUFFER_SIZE messages of each topic are kept so a reconnecting
+    client can be sent just what it missed since its last seq.
+
+    The backplane also carries invalidations of the in-process caches
+    registered with `share_cache`, so a change made on one worker is not
+    served stale from another's copy.
+    """
+
+    def __init__(self, backplane: Optional[Backplane] = None):
+        self.active_connections: dict[str, dict[WebSocket, _Connection]] = defaultdict(
+            dict
+        )
+        self.subscribers: dict[str, set[_Connection]] = defaultdict(set)
+        self._closing: set[asyncio.Task] = set()
+        self.backplane = backplane or MemoryBackplane()
+        self._started = False
+        self._heartbeat: Optional[asyncio.Task] = None
+        self.stats = _SendStats()
+        self._history: dict[str, deque] = {}
+        self._evicted_through: dict[str, int] = {}
+        # First seq this worker has seen with no gap since; None = none yet.
+        self._history_since: Optional[int] = None
+        self.last_seq = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._outbox_wake = asyncio.Event()
+        self._caches: dict[str, TTLCache] = {}
+        on_outbox_commit(self._outbox_committed)
+
+    async def start(self, backplane: Optional[Backplane] = None) -> None:
+        if backplane is not None:
+            self.backplane = backplane
+        await self.backplane.start(self._deliver)
+        self._started = True
+        self.ensure_dispatcher()
+
+    async def stop(self) -> None:
+        self._started = False
+        for task in (self._heartbeat, self._dispatcher):
+            if task is not None:
+                task.cancel()
+        self._heartbeat = self._dispatcher = None
+        await self.backplane.stop()
+
+    def ensure_dispatcher(self) -> None:
+        """Start the outbox dispatcher on this event loop if it isn't running."""
+        self._loop = asyncio.get_running_loop()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._run_dispatcher())
+
+    def _outbox_committed(self) -> None:
+        # Runs right after the commit, on the loop thread for async routes
+        # and on a worker thread for sync ones.
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            if self._loop is not None and not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(self._wake_dispatcher)
+            return
+        self._wake_dispatcher()
 
-    async def connect(self, websocket: WebSocket, user_id: str) -> None:
+    def _wake_dispatcher(self) -> None:
+        self.ensure_dispatcher()
+        self._outbox_wake.set()
+
+    async def _run_dispatcher(self) -> None:
+        """
+        Deliver committed outbox rows. Woken right after a local commit that
+        wrote some, otherwise checks every OUTBOX_POLL_INTERVAL_SECONDS for
+        rows committed by other workers. After waking it lingers
+        OUTBOX_COALESCE_MS so a burst goes out as one batch.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._outbox_wake.wait(), settings.OUTBOX_POLL_INTERVAL_SECONDS
+                )
+                await asyncio.sleep(settings.OUTBOX_COALESCE_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._outbox_wake.clear()
+            try:
+                await self.dispatch_outbox()
+            except Exception:
+                logger.exception("Failed to dispatch notification outbox")
+                await asyncio.sleep(settings.OUTBOX_POLL_INTERVAL_SECONDS)
+
+    async def dispatch_outbox(self) -> int:
+        """Deliver everything committed to the outbox so far; returns the count."""
+        if not self._started:
+            await self.start()
+        delivered = 0
+        while True:
+            claimed, envelopes = await drain_outbox(settings.OUTBOX_BATCH_SIZE)
+            for envelope in envelopes:
+                payload = envelope.pop("payload")
+                envelope["message"] = json.dumps({**payload, "seq": envelope["seq"]})
+                await self.backplane.publish(envelope)
+            delivered += len(envelopes)
+            if claimed < settings.OUTBOX_BATCH_SIZE:
+                return delivered
+
+    async def _publish(
+        self, topics: Optional[list[str]], data: Union[str, dict]
+    ) -> None:
+        # Recorded first, which numbers the event and makes it available to
+        # /live/events pollers, then fanned out to every worker's sockets.
+        payload = _as_payload(data)
+        seq = await record_event(topics, payload)
+        if not self._started:
+            await self.start()
+        await self.backplane.publish(
+            {
+                "topics": topics,
+                "seq": seq,
+                "message": json.dumps({**payload, "seq": seq}),
+            }
+        )
+
+    def share_cache(self, name: str, cache: TTLCache) -> None:
+        """Make `cache` reachable by invalidate_everywhere(name, ...)."""
+        self._caches[name] = cache
+
+    def invalidate_everywhere(self, name: str, key) -> None:
         """
-        Accepts a WebSocket connection and registers it under the given user_id.
+        Drop `key` from the shared cache `name` on this worker at once and on
+        every worker through the backplane. `key` must survive a JSON round
+        trip. Callable from any thread; before the manager has an event loop
+        only this worker's entry is dropped.
+        """
+        self._caches[name].invalidate(key)
+        if self._loop is not None and not self._loop.is_closed():
+            asyncio.run_coroutine_threadsafe(
+                self._publish_invalidation({"invalidate": name, "key": key}),
+                self._loop,
+            )
+
+    async def _publish_invalidation(self, envelope: dict) -> None:
+        try:
+            if not self._started:
+                await self.start()
+            await self.backplane.publish(envelope)
+        except Exception:
+            logger.exception("Failed to publish cache invalidation %s", envelope)
+
+    async def _deliver(self, envelope: dict) -> None:
+        if envelope.get("reset"):
+            self._history_since = None
+            # Invalidations may have been missed as well.
+            for cache in self._caches.values():
+                cache.clear()
+            return
+        if "invalidate" in envelope:
+            cache = self._caches.get(envelope["invalidate"])
+            if cache is not None:
+                cache.invalidate(envelope["key"])
+            return
+        self._remember(envelope, envelope["seq"])
+        topics = envelope.get("topics")
+        if topics is None:
+            targets = {
+                connection
+                for connections in self.active_connections.values()
+                for connection in connections.values()
+            }
+        else:
+            # A socket on several of the topics still gets the message once.
+            targets = set().union(*(self.subscribers.get(t, ()) for t in topics))
+        for connection in list(targets):
+            self._enqueue(connection, envelope["message"])
+
+    def _remember(self, envelope: dict, seq: int) -> None:
+        if self._history_since is None:
+            self._history_since = seq
+        self.last_seq = max(self.last_seq, seq)
+        for topic in envelope.get("topics") or (_ALL,):
+            history = self._history.get(topic)
+            if history is None:
+                history = self._history[topic] = deque(
+                    maxlen=settings.WS_REPLAY_BUFFER_SIZE
+                )
+            elif len(history) == history.maxlen:
+                self._evicted_through[topic] = history[0][0]
+            history.append((seq, envelope["message"]))
+
+    def replay(
+        self, connection: _Connection, topics, last_seq: int, broadcasts: bool = True
+    ) -> None:
+        """
+        Queue the messages on `topics` (and broadcasts) newer than `last_seq`.
+        If some of them are no longer buffered here, or there are too many,
+        send {"type": "resync"} instead so the client reloads its lists.
+        """
+        missed = {}
+        complete = (
+            self._history_since is not None and last_seq + 1 >= self._history_since
+        )
+        for topic in (*topics, _ALL) if broadcasts else topics:
+            if not complete or self._evicted_through.get(topic, 0) > last_seq:
+                complete = False
+                break
+            for seq, message in self._history.get(topic, ()):
+                if seq > last_seq:
+                    missed[seq] = message
+        if last_seq >= self.last_seq:
+            return
+        if not complete or len(missed) > settings.WS_SEND_QUEUE_SIZE // 2:
+            self._enqueue(
+                connection, json.dumps({"type": "resync", "seq": self.last_seq})
+            )
+            return
+        for seq in sorted(missed):
+            self._enqueue(connection, missed[seq])
+
+    async def connect(
+        self, websocket: WebSocket, user_id: str, is_admin: bool = False
+    ) -> _Connection:
+        """
+        Accepts a WebSocket connection, registers it under the given user_id
+        and subscribes it to its user topic and DEFAULT_TOPICS.
         """
         await websocket.accept()
-        self.active_connections[user_id].add(websocket)
+        connection = _Connection(websocket, user_id, is_admin)
+        connection.writer = asyncio.create_task(self._write(connection))
+        self.active_connections[user_id][websocket] = connection
+        self.subscribe(connection, [user_topic(user_id), *DEFAULT_TOPICS])
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._run_heartbeat())
+        return connection
+
+    async def _run_heartbeat(self) -> None:
+        """
+        Every WS_PING_INTERVAL_SECONDS, ping each socket and drop those that
+        haven't sent anything (pong included) for WS_IDLE_TIMEOUT_SECONDS,
+        or whose writer has already stopped. Half-open sockets never raise
+        on receive, so without this they would stay registered forever.
+        """
+        while True:
+            await asyncio.sleep(settings.WS_PING_INTERVAL_SECONDS)
+            deadline = time.monotonic() - settings.WS_IDLE_TIMEOUT_SECONDS
+            ping = json.dumps({"type": "ping"})
+            for connections in list(self.active_connections.values()):
+                for connection in list(connections.values()):
+                    if connection.last_seen < deadline or connection.writer.done():
+                        logger.info(
+                            "Reaping idle WebSocket for user %s", connection.user_id
+                        )
+                        self._drop(connection, code=1001)
+                    else:
+                        self._enqueue(connection, ping)
+
+    def metrics(self) -> dict:
+        """Live numbers for this worker's sockets."""
+        depths = [
+            connection.queue.qsize()
+            for connections in self.active_connections.values()
+            for connection in connections.values()
+        ]
+        return {
+            "connections": len(depths),
+            "users": len(self.active_connections),
+            "topics": len(self.subscribers),
+            "messages_sent_total": self.stats.sent_total,
+            "messages_per_second": round(self.stats.per_second(), 2),
+            "connections_dropped_total": self.stats.dropped_total,
+            "queue_depth": {
+                "max": max(depths, default=0),
+                "mean": round(sum(depths) / len(depths), 2) if depths else 0,
+            },
+            "send_latency_ms": self.stats.latency_ms(),
+            "last_seq": self.last_seq,
+        }
+
+    def subscribe(self, connection: _Connection, topics: list[str]) -> list[str]:
+        """Subscribe to the allowed `topics`; returns those that were refused."""
+        refused = []
+        for topic in topics:
+            if not topic_allowed(topic, connection.user_id, connection.is_admin):
+                refused.append(topic)
+                continue
+            connection.topics.add(topic)
+            self.subscribers[topic].add(connection)
+        return refused
+
+    def unsubscribe(self, connection: _Connection, topics: list[str]) -> None:
+        for topic in topics:
+            connection.topics.discard(topic)
+            subscribers = self.subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(connection)
+                if not subscribers:
+                    del self.subscribers[topic]
+
+    def handle_client_message(self, connection: _Connection, text: str) -> None:
+        """
+        Applies a client control message:
+        {"action": "subscribe" | "unsubscribe", "topics": [...]}, where a
+        subscribe may add "last_seq" to replay what those topics missed, or
+        {"action": "ping"}. Anything else (e.g. a pong) only counts as
+        activity for the heartbeat.
+        """
+        connection.last_seen = time.monotonic()
+        try:
+            request = json.loads(text)
+        except ValueError:
+            return
+        if not isinstance(request, dict):
+            return
+        action, topics = request.get("action"), request.get("topics")
+        if action == "ping":
+            self._enqueue(connection, json.dumps({"type": "pong"}))
+            return
+        if action not in ("subscribe", "unsubscribe"):
+            return
+        if not isinstance(topics, list) or not all(isinstance(t, str) for t in topics):
+            self._enqueue(
+                connection,
+                json.dumps({"type": "error", "detail": "topics must be a list"}),
+            )
+            return
+        refused = []
+        if action == "subscribe":
+            refused = self.subscribe(connection, topics)
+        else:
+            self.unsubscribe(connection, topics)
+        reply = {"type": "subscriptions", "topics": sorted(connection.topics)}
+        if refused:
+            reply["refused"] = refused
+        self._enqueue(connection, json.dumps(reply))
+        if action == "subscribe" and isinstance(request.get("last_seq"), int):
+            added = [t for t in topics if t not in refused]
+            self.replay(connection, added, request["last_seq"], broadcasts=False)
 
     def disconnect(self, websocket: WebSocket, user_id: str) -> None:
         """
-        Removes a WebSocket connection for the given user_id.
+        Removes a WebSocket connection for the given user_id and stops its
+        writer. Safe to call more than once.
         """
-        if user_id in self.active_connections:
-            self.active_connections[user_id].discard(websocket)
-            if not self.active_connections[user_id]:
-                del self.active_connections[user_id]
+        connections = self.active_connections.get(user_id)
+        if connections is None:
+            return
+        connection = connections.pop(websocket, None)
+        if not connections:
+            del self.active_connections[user_id]
+        if connection is None:
+            return
+        self.unsubscribe(connection, list(connection.topics))
+        if connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+
+    async def _write(self, connection: _Connection) -> None:
+        websocket = connection.websocket
+        try:
+            while True:
+                enqueued_at, message = await connection.queue.get()
+                await asyncio.wait_for(
+                    websocket.send_text(message),
+                    timeout=settings.WS_SEND_TIMEOUT_SECONDS,
+                )
+                self.stats.record(time.monotonic() - enqueued_at)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:  # timed out or the socket is gone
+            logger.info("Dropping WebSocket for user %s: %r", connection.user_id, exc)
+            self.stats.dropped_total += 1
+            self.disconnect(websocket, connection.user_id)
+            await self._close(websocket)
+
+    def _drop(self, connection: _Connection, code: int = 1013) -> None:
+        self.stats.dropped_total += 1
+        self.disconnect(connection.websocket, connection.user_id)
+        task = asyncio.create_task(self._close(connection.websocket, code))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int = 1013) -> None:
+        try:
+            await websocket.close(code=code)  # 1013: try again later
+        except Exception:
+            pass
+
+    def _enqueue(self, connection: _Connection, message: str) -> None:
+        try:
+            connection.queue.put_nowait((time.monotonic(), message))
+        except asyncio.QueueFull:
+            # The client has fallen WS_SEND_QUEUE_SIZE messages behind; drop
+            # it rather than buffer without bound. It will reconnect.
+            logger.warning(
+                "WebSocket send queue full for user %s, disconnecting",
+                connection.user_id,
+            )
+            self._drop(connection)
 
     async def send_personal(self, data: Union[str, dict], user_id: str) -> None:
         """
         Sends a message to all WebSocket connections for a specific user_id.
         Accepts either a raw JSON string or a Python dict.
         """
-        # Serialize dicts to JSON strings
-        message = data if isinstance(data, str) else json.dumps(data)
-        for connection in self.active_connections.get(user_id, []):
-            await connection.send_text(message)
+        await self.publish([user_topic(user_id)], data)
+
+    async def publish(self, topics: list[str], data: Union[str, dict]) -> None:
+        """
+        Sends a message to every WebSocket subscribed to any of `topics`.
+        """
+        await self._publish(list(topics), data)
 
     async def broadcast(self, data: Union[str, dict]) -> None:
         """
         Broadcasts a message to every connected WebSocket across all user_ids.
         Accepts either a raw JSON string or a Python dict.
+
+        Only queues the message; each connection's writer sends it, so this
+        returns without waiting on any client.
         """
-        message = data if isinstance(data, str) else json.dumps(data)
-        for connections in self.active_connections.values():
-            for connection in connections:
-                await connection.send_text(message)
+        await self._publish(None, data)
+
+
+def _as_payload(data: Union[str, dict]) -> dict:
+    if isinstance(data, dict):
+        return data
+    try:
+        payload = json.loads(data)
+    except ValueError:
+        payload = None
+    return payload if isinstance(payload, dict) else {"message": data}
 
 
 manager = ConnectionManager()
+
+
+async def start_live_notifications() -> None:
+    await manager.start(create_backplane(settings.WS_BACKPLANE))
+
+
+async def stop_live_notifications() -> None:
+    await manager.stop()
@@ -22,6 +22,13 @@ from app.models.trnsx_status_log import TransactionStatusLog
 from app.models.transaction_currency_lot import TransactionCurrencyLot
 from app.models.currency_lot import CurrencyLot
 from app.models.transaction_report import TransactionReport
+from app.models.daily_transaction_rollup import DailyTransactionRollup
+from app.models.idempotency_key import IdempotencyKey
+from app.models.notification_event import (
+    NotificationEvent,
+    NotificationOutbox,
+    live_events_seq,
+)
 from app.core.config import settings
 
 load_dotenv()
@@ -0,0 +1,48 @@
+"""
+add currency lot fifo indexes
+
+Revision ID: 4b7e21c9d3a0
+Revises: 2583afe4e5de
+Create Date: 2026-10-17 09:12:40.118204
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "4b7e21c9d3a0"
+down_revision = "2583afe4e5de"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_currency_lots_currency_id_created_at",
+        "currency_lots",
+        ["currency_id", "created_at"],
+        unique=False,
+        if_not_exists=True,
+    )
+    # Partial index: only lots with stock left, so its size tracks open
+    # inventory rather than the whole lot history.
+    op.create_index(
+        "ix_currency_lots_open_fifo",
+        "currency_lots",
+        ["currency_id", "created_at", "id"],
+        unique=False,
+        postgresql_where=sa.text("remaining_quantity > 0"),
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_currency_lots_open_fifo", table_name="currency_lots", if_exists=True
+    )
+    op.drop_index(
+        "ix_currency_lots_currency_id_created_at",
+        table_name="currency_lots",
+        if_exists=True,
+    )
@@ -0,0 +1,36 @@
+"""
+add idempotency keys
+
+Revision ID: 5f3b8e6a0d19
+Revises: e4a9c2d71b58
+Create Date: 2026-10-17 16:05:33.902117
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "5f3b8e6a0d19"
+down_revision = "e4a9c2d71b58"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "idempotency_keys",
+        sa.Column("scope", sa.String(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("request_hash", sa.String(), nullable=False),
+        sa.Column("response", postgresql.JSONB(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("scope", "user_id", "key"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("idempotency_keys")
@@ -0,0 +1,72 @@
+"""
+add daily transaction rollups
+
+Revision ID: 9d3f5a1e7c42
+Revises: 4b7e21c9d3a0
+Create Date: 2026-10-17 11:40:02.513877
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "9d3f5a1e7c42"
+down_revision = "4b7e21c9d3a0"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "daily_transaction_rollups",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("employee_id", sa.Integer(), nullable=False),
+        sa.Column("service_id", sa.Integer(), nullable=False),
+        sa.Column("currency_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "status",
+            postgresql.ENUM(
+                "pending",
+                "completed",
+                "cancelled",
+                name="transactionstatus",
+                create_type=False,
+            ),
+            nullable=False,
+        ),
+        sa.Column("txn_count", sa.Integer(), nullable=False),
+        sa.Column("amount_foreign", sa.Float(), nullable=False),
+        sa.Column("amount_lyd", sa.Float(), nullable=False),
+        sa.Column("profit", sa.Float(), nullable=False),
+        sa.Column("cost", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint(
+            "day", "employee_id", "service_id", "currency_id", "status"
+        ),
+    )
+
+    # Backfill from history; app/services/rollup_service.py can rebuild later.
+    op.execute("""
+    INSERT INTO daily_transaction_rollups
+      (day, employee_id, service_id, currency_id, status,
+       txn_count, amount_foreign, amount_lyd, profit, cost)
+    SELECT
+      CAST(created_at AS DATE),
+      employee_id,
+      COALESCE(service_id, 0),
+      COALESCE(currency_id, 0),
+      status,
+      COUNT(*),
+      COALESCE(SUM(amount_foreign), 0),
+      COALESCE(SUM(amount_lyd), 0),
+      COALESCE(SUM(profit), 0),
+      COALESCE(SUM(amount_lyd - profit), 0)
+    FROM transactions
+    WHERE created_at IS NOT NULL AND status IS NOT NULL
+    GROUP BY 1, 2, 3, 4, 5;
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table("daily_transaction_rollups")
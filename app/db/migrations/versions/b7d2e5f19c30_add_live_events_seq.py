@@ -0,0 +1,27 @@
+"""
+add live events sequence
+
+Revision ID: b7d2e5f19c30
+Revises: 5f3b8e6a0d19
+Create Date: 2026-10-17 19:02:41.118305
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "b7d2e5f19c30"
+down_revision = "5f3b8e6a0d19"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        sa.schema.CreateSequence(sa.Sequence("live_events_seq"), if_not_exists=True)
+    )
+
+
+def downgrade() -> None:
+    op.execute(sa.schema.DropSequence(sa.Sequence("live_events_seq"), if_exists=True))
@@ -0,0 +1,46 @@
+"""
+add transaction pagination indexes
+
+Revision ID: c81f4e0b6a27
+Revises: 9d3f5a1e7c42
+Create Date: 2026-10-17 14:02:51.530914
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "c81f4e0b6a27"
+down_revision = "9d3f5a1e7c42"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Match ORDER BY created_at DESC, id DESC of the paginated listings.
+    op.create_index(
+        "ix_transactions_employee_created_at_id",
+        "transactions",
+        ["employee_id", sa.text("created_at DESC"), sa.text("id DESC")],
+        unique=False,
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_transactions_created_at_id",
+        "transactions",
+        [sa.text("created_at DESC"), sa.text("id DESC")],
+        unique=False,
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_transactions_created_at_id", table_name="transactions", if_exists=True
+    )
+    op.drop_index(
+        "ix_transactions_employee_created_at_id",
+        table_name="transactions",
+        if_exists=True,
+    )
@@ -0,0 +1,42 @@
+"""
+add notification events
+
+Revision ID: d3a8f61c2e47
+Revises: b7d2e5f19c30
+Create Date: 2026-10-17 20:14:52.337019
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "d3a8f61c2e47"
+down_revision = "b7d2e5f19c30"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "notification_events",
+        sa.Column("seq", sa.BigInteger(), nullable=False),
+        sa.Column("topics", postgresql.ARRAY(sa.String()), nullable=True),
+        sa.Column("payload", postgresql.JSONB(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("seq"),
+    )
+    op.create_index(
+        op.f("ix_notification_events_created_at"),
+        "notification_events",
+        ["created_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f("ix_notification_events_created_at"), table_name="notification_events"
+    )
+    op.drop_table("notification_events")
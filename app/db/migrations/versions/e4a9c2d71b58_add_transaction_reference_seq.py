@@ -0,0 +1,32 @@
+"""
+add transaction reference sequence
+
+Revision ID: e4a9c2d71b58
+Revises: c81f4e0b6a27
+Create Date: 2026-10-17 15:21:07.449310
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "e4a9c2d71b58"
+down_revision = "c81f4e0b6a27"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        sa.schema.CreateSequence(
+            sa.Sequence("transaction_reference_seq", start=100000),
+            if_not_exists=True,
+        )
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        sa.schema.DropSequence(sa.Sequence("transaction_reference_seq"), if_exists=True)
+    )
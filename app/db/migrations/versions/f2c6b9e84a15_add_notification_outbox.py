@@ -0,0 +1,34 @@
+"""
+add notification outbox
+
+Revision ID: f2c6b9e84a15
+Revises: d3a8f61c2e47
+Create Date: 2026-10-17 21:03:18.540226
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "f2c6b9e84a15"
+down_revision = "d3a8f61c2e47"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "notification_outbox",
+        sa.Column("id", sa.BigInteger(), nullable=False),
+        sa.Column("topics", postgresql.ARRAY(sa.String()), nullable=True),
+        sa.Column("payload", postgresql.JSONB(), nullable=False),
+        sa.Column("coalesce_key", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("notification_outbox")
@@ -1,9 +1,20 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 from app.core.config import settings
 
-
 engine = create_engine(settings.DATABASE_URI, echo=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+
+# Same database through the psycopg 3 async driver, for `async def` routes.
+async_engine = create_async_engine(
+    make_url(settings.DATABASE_URI).set(drivername="postgresql+psycopg"), echo=True
+)
+# Objects stay loaded after commit: an expired attribute would need a lazy
+# load, which an AsyncSession can't do implicitly.
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
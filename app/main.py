@@ -10,6 +10,10 @@ from fastapi.responses import JSONResponse
 
 from app.routes.endpoints import api_router
 from app.core.config import settings
+from app.core.hashing import shutdown_hashing_executor
+from app.core.websocket import start_live_notifications, stop_live_notifications
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.services.idempotency_service import REPLAYED_HEADER
 
 
 # Define allowed origins directly
@@ -43,6 +47,16 @@ origins = [os.getenv("FRONTEND_ORIGIN", "https://africa-front.vercel.app"),
 #         logger.info("Shutdown complete.")
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):  # pylint: disable=unused-argument
+    await start_live_notifications()
+    try:
+        yield
+    finally:
+        await stop_live_notifications()
+        shutdown_hashing_executor()
+
+
 def create_app() -> FastAPI:
     # Initialize Sentry
     # setup(settings)
@@ -52,7 +66,7 @@ def create_app() -> FastAPI:
         openapi_url=f"{settings.API_V1_STR}/openapi.json",
         docs_url="/",
         generate_unique_id_function=lambda router: f"{router.tags[0]}-{router.name}",
-        # lifespan=lifespan,
+        lifespan=lifespan,
     )
 
     # Add Sentry ASGI middleware
@@ -65,6 +79,7 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
         allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER, REPLAYED_HEADER],
     )
 
     @main_app.exception_handler(RequestValidationError)
@@ -13,3 +13,6 @@ from .trnsx_status_log import TransactionStatusLog
 from .transaction_currency_lot import TransactionCurrencyLot
 from .currency_lot import CurrencyLot
 from .transaction_report import TransactionReport
+from .daily_transaction_rollup import DailyTransactionRollup
+from .idempotency_key import IdempotencyKey
+from .notification_event import NotificationEvent, NotificationOutbox
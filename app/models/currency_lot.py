@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from app.db.session import Base
 from app.models.currency import Currency
@@ -7,6 +7,17 @@ from app.models.currency import Currency
 
 class CurrencyLot(Base):
     __tablename__ = "currency_lots"
+    __table_args__ = (
+        Index("ix_currency_lots_currency_id_created_at", "currency_id", "created_at"),
+        # FIFO queue of lots that still hold stock, used by allocation
+        Index(
+            "ix_currency_lots_open_fifo",
+            "currency_id",
+            "created_at",
+            "id",
+            postgresql_where=text("remaining_quantity > 0"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True)
     currency_id = Column(
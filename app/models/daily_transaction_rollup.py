@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, Float, Date, Enum
+from app.db.session import Base
+from app.schemas.transactions import TransactionStatus
+
+
+class DailyTransactionRollup(Base):
+    """
+    Per-day totals of transactions, maintained in the same DB transaction as
+    every write to `transactions` (see app/services/rollup_service.py).
+
+    service_id / currency_id use 0 for transactions without one.
+    """
+
+    __tablename__ = "daily_transaction_rollups"
+
+    day = Column(Date, primary_key=True)
+    employee_id = Column(Integer, primary_key=True)
+    service_id = Column(Integer, primary_key=True)
+    currency_id = Column(Integer, primary_key=True)
+    status = Column(Enum(TransactionStatus), primary_key=True)
+
+    txn_count = Column(Integer, nullable=False, default=0)
+    amount_foreign = Column(Float, nullable=False, default=0.0)
+    amount_lyd = Column(Float, nullable=False, default=0.0)
+    profit = Column(Float, nullable=False, default=0.0)
+    cost = Column(Float, nullable=False, default=0.0)
@@ -0,0 +1,24 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.dialects.postgresql import JSONB
+from app.db.session import Base
+
+
+class IdempotencyKey(Base):
+    """
+    Stored response of a POST made with an Idempotency-Key header, replayed
+    when the same user retries the same request until expires_at. The row is
+    written with the request's own transaction and response is filled in
+    right after, so it is NULL while that is pending.
+    """
+
+    __tablename__ = "idempotency_keys"
+
+    scope = Column(String, primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    key = Column(String, primary_key=True)
+
+    request_hash = Column(String, nullable=False)
+    response = Column(JSONB)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
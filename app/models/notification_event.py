@@ -0,0 +1,41 @@
+from datetime import datetime
+from sqlalchemy import BigInteger, Column, DateTime, Sequence, String
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from app.db.session import Base
+
+# Global, monotonically increasing number of every live notification, shared
+# by all workers so reconnecting clients can ask for what they missed.
+live_events_seq = Sequence("live_events_seq", metadata=Base.metadata)
+
+
+class NotificationEvent(Base):
+    """
+    A live notification as sent to WebSocket subscribers, kept so clients
+    that can't hold a socket open (serverless) can poll for what's new.
+    """
+
+    __tablename__ = "notification_events"
+
+    # Drawn from live_events_seq when the event is recorded.
+    seq = Column(BigInteger, primary_key=True, autoincrement=False)
+    # NULL: a broadcast to everyone.
+    topics = Column(ARRAY(String), nullable=True)
+    payload = Column(JSONB, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class NotificationOutbox(Base):
+    """
+    A notification written in the same transaction as the change it is
+    about. The dispatcher turns committed rows into NotificationEvents and
+    deletes them.
+    """
+
+    __tablename__ = "notification_outbox"
+
+    id = Column(BigInteger, primary_key=True)
+    topics = Column(ARRAY(String), nullable=True)
+    payload = Column(JSONB, nullable=False)
+    # Rows sharing a key that are dispatched together go out as one event.
+    coalesce_key = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -7,6 +7,9 @@ from sqlalchemy import (
     Float,
     DateTime,
     Enum as SQLEnum,
+    Index,
+    Sequence,
+    text,
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -14,9 +17,27 @@ from app.db.session import Base
 from app.schemas.transactions import PaymentType, TransactionStatus
 from sqlalchemy.ext.hybrid import hybrid_property
 
+# Numeric part of Transaction.reference; starts at 6 digits so it never meets
+# the old random 3-digit references.
+transaction_reference_seq = Sequence(
+    "transaction_reference_seq", start=100000, metadata=Base.metadata
+)
+
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        # keyset pagination, newest first (see app/core/pagination.py)
+        Index(
+            "ix_transactions_employee_created_at_id",
+            "employee_id",
+            text("created_at DESC"),
+            text("id DESC"),
+        ),
+        Index(
+            "ix_transactions_created_at_id", text("created_at DESC"), text("id DESC")
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     reference = Column(String, unique=True, index=True)
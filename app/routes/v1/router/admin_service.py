@@ -1,16 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from typing import List, Optional
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from app.schemas.service import ServiceCreate, ServiceOut, ServiceUpdate
-from app.dependencies import get_db
+from app.dependencies import get_async_db, get_db
 from app.models.service import Service
 from app.core.security import require_admin, get_current_user
 from app.services.treasury_service import transfer_amount
-from app.core.websocket import manager
+from app.core.websocket import TOPIC_ADMIN, TOPIC_SERVICES, user_topic
+from app.services.notification_service import queue_notification
 from app.models.transactions import Transaction
 from app.models.users import User
 from app.services.service_service import create_service
+from app.services.idempotency_service import (
+    IDEMPOTENCY_HEADER,
+    REPLAYED_HEADER,
+    run_idempotent_async,
+)
 
 router = APIRouter()
 
@@ -31,22 +39,24 @@ async def update_service(
     service_id: int,
     data: ServiceUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    service = db.query(Service).filter(Service.id == service_id).first()
+    service = await db.get(Service, service_id)
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
 
     for field, value in data.dict(exclude_unset=True).items():
         setattr(service, field, value)
 
-    db.commit()
-    db.refresh(service)
-
     # إشعار الجميع
-    await manager.broadcast(
-        {"type": "service_update", "content": f"🔔 تم تعديل الخدمة: {service.name}"}
+    queue_notification(
+        db,
+        [TOPIC_SERVICES],
+        {"type": "service_update", "content": f"🔔 تم تعديل الخدمة: {service.name}"},
+        coalesce_key=f"service_updated:{service_id}",
     )
+    await db.commit()
+    await db.refresh(service)
 
     return service
 
@@ -58,26 +68,28 @@ async def update_service(
 async def delete_service(
     service_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    has_transactions = (
-        db.query(Transaction).filter(Transaction.service_id == service_id).first()
+    has_transactions = await db.scalar(
+        select(Transaction.id).where(Transaction.service_id == service_id).limit(1)
     )
     if has_transactions:
         raise HTTPException(
             status_code=400, detail="❌ لا يمكن حذف الخدمة لأنها مرتبطة بحوالات موجودة."
         )
 
-    service = db.query(Service).filter(Service.id == service_id).first()
+    service = await db.get(Service, service_id)
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
 
-    db.delete(service)
-    db.commit()
-
-    await manager.broadcast(
-        {"type": "service_delete", "content": f"🗑️ تم حذف الخدمة: {service.name}"}
+    await db.delete(service)
+    queue_notification(
+        db,
+        [TOPIC_SERVICES],
+        {"type": "service_delete", "content": f"🗑️ تم حذف الخدمة: {service.name}"},
+        coalesce_key=f"service_deleted:{service_id}",
     )
+    await db.commit()
 
     return {"detail": f"✅ تم حذف الخدمة: {service.name}"}
 
@@ -96,22 +108,41 @@ class TransferRequest(BaseModel):
 @router.post("/transfer", dependencies=[Depends(require_admin)])
 async def admin_transfer(
     payload: TransferRequest,
-    # current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    response: Response,
+    idempotency_key: Optional[str] = Header(
+        None, alias=IDEMPOTENCY_HEADER, max_length=255
+    ),
+    current_user: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    transfer = transfer_amount(
-        db,
-        payload.from_employee_id,
-        payload.to_employee_id,
-        payload.amount,
-    )
+    async def transfer():
+        message = {
+            "type": "treasury_transfer",
+            "content": f"💸 تم تحويل {payload.amount} LYD من موظف #{payload.from_employee_id} إلى #{payload.to_employee_id}",
+        }
+        # Sent with the transfer's commit
+        queue_notification(
+            db,
+            [
+                user_topic(payload.from_employee_id),
+                user_topic(payload.to_employee_id),
+                TOPIC_ADMIN,
+            ],
+            message,
+        )
 
-    message = {
-        "type": "treasury_transfer",
-        "content": f"💸 تم تحويل {payload.amount} LYD من موظف #{payload.from_employee_id} إلى #{payload.to_employee_id}",
-    }
+        transfer = await db.run_sync(
+            transfer_amount,
+            payload.from_employee_id,
+            payload.to_employee_id,
+            payload.amount,
+        )
 
-    await manager.send_personal(message, payload.from_employee_id)
-    await manager.send_personal(message, payload.to_employee_id)
+        return {"detail": "✅ تم التحويل بنجاح", "transfer_id": transfer.id}
 
-    return {"detail": "✅ تم التحويل بنجاح", "transfer_id": transfer.id}
+    result, replayed = await run_idempotent_async(
+        db, "admin.transfer", current_user.id, idempotency_key, payload, transfer
+    )
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return result
@@ -1,18 +1,20 @@
 from fastapi import Depends, HTTPException, APIRouter, status
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
-from app.dependencies import get_db
+from app.dependencies import get_async_db, get_db
 from app.core.security import require_admin
-from app.core.websocket import manager
+from app.core.websocket import TOPIC_ADMIN, user_topic
 from app.models.transactions import Transaction
 from app.models.transaction_audit import TransactionAudit
 from app.models.users import User
 from app.schemas.transactions import TransactionStatusUpdate
+from app.services.notification_service import queue_notification
 from app.services.transactions_service import update_transaction_status
 from app.models.trnsx_status_log import TransactionStatusLog
 
-
 router = APIRouter()
 
 
@@ -20,36 +22,44 @@ router = APIRouter()
 async def change_status(
     tx_id: int,
     status_data: TransactionStatusUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_admin: User = Depends(require_admin),
 ):  # TODO add relation between employee adn transaction
-    txn = update_transaction_status(
+    employee_id = await db.scalar(
+        select(Transaction.employee_id).where(Transaction.id == tx_id)
+    )
+    # Notify the employee who made the transaction, and the admin feed, with
+    # the status change's commit
+    queue_notification(
         db,
+        [user_topic(employee_id), TOPIC_ADMIN],
+        {
+            "type": "status_update",
+            "content": f"تم تغيير حالة الحوالة #{tx_id} إلى {status_data.status}",
+        },
+    )
+    txn = await db.run_sync(
+        update_transaction_status,
         transaction_id=tx_id,
         new_status=status_data.status,
         reason=status_data.reason,
         modified_by=current_admin.id,
     )
-    # Notify the employee about status change
-    await manager.broadcast(
-        {
-            "type": "status_update",
-            "content": f"تم تغيير حالة الحوالة #{tx_id} إلى {status_data.status}",
-        }
-    )
     return txn
 
 
 @router.put("/transaction/{tx_id}/cancel", dependencies=[Depends(require_admin)])
-async def cancel_transaction(tx_id: int, db: Session = Depends(get_db)):
-    txn = db.query(Transaction).filter(Transaction.id == tx_id).first()
+async def cancel_transaction(tx_id: int, db: AsyncSession = Depends(get_async_db)):
+    txn = await db.get(Transaction, tx_id)
     if not txn:
         raise HTTPException(status_code=404, detail="Transaction not found")
     txn.reference += "_CANCELLED"
-    db.commit()
-    await manager.broadcast(
-        {"type": "transaction_cancelled", "content": f"تم إلغاء الحوالة #{tx_id}"}
+    queue_notification(
+        db,
+        [user_topic(txn.employee_id), TOPIC_ADMIN],
+        {"type": "transaction_cancelled", "content": f"تم إلغاء الحوالة #{tx_id}"},
     )
+    await db.commit()
     return {"detail": "Transaction cancelled"}
 
 
@@ -1,7 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, Body
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel, Field
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.hashing import hash_password_async, verify_password_async
 from app.core.websocket import manager
 from app.schemas.users import UserCreate, UserOut, UserRoleUpdate
 from app.services.auth_service import (
@@ -10,10 +13,9 @@ from app.services.auth_service import (
     update_user_password,
     update_user_full_name,
 )
-from app.dependencies import get_db
+from app.dependencies import get_async_db, get_db
 from app.models.users import User
 from app.core.security import (
-    verify_password,
     create_access_token,
     get_current_user,
     require_admin,
@@ -29,11 +31,12 @@ class PasswordChange(BaseModel):
 
 
 @router.post("/register", response_model=UserOut, dependencies=[Depends(require_admin)])
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Admin-only: Create a new user account
     """
-    created_user = create_user(db, user_data)
+    hashed_password = await hash_password_async(user_data.password)
+    created_user = await db.run_sync(create_user, user_data, hashed_password)
     # Notify the newly registered user
     # await manager.send_personal_message(
     #     created_user.id,
@@ -56,11 +59,19 @@ def read_profile(current_user: User = Depends(get_current_user)):
 
 
 @router.post("/login")
-def login(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+async def login(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    user_record = db.query(User).filter(User.username == form_data.username).first()
-    if not user_record or not verify_password(
+    user_record = (
+        await db.execute(
+            select(User.id, User.role, User.hashed_password).where(
+                User.username == form_data.username
+            )
+        )
+    ).first()
+    # bcrypt runs in the hashing pool; the event loop keeps serving meanwhile.
+    if not user_record or not await verify_password_async(
         form_data.password, user_record.hashed_password
     ):
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -78,12 +89,15 @@ async def admin_change_user_password(
     user_id: int,
     password_change: PasswordChange,
     admin_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Admin-only: Change any employee's password
     """
-    updated_user = update_user_password(db, user_id, password_change.new_password)
+    hashed = await hash_password_async(password_change.new_password)
+    updated_user = await db.run_sync(
+        update_user_password, user_id, password_change.new_password, hashed
+    )
     # Notify the admin who performed the change
     # await manager.send_personal_message(
     #     admin_user.id,
@@ -99,13 +113,13 @@ async def admin_change_user_password(
 async def change_user_role(
     user_id: int,
     role_data: UserRoleUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     admin_user: User = Depends(require_admin),
 ):
     """
     Admin-only: Change the role of a specific user
     """
-    updated_user = update_user_role(db, user_id, role_data.role)
+    updated_user = await db.run_sync(update_user_role, user_id, role_data.role)
     # Notify the user whose role was changed
     # await manager.send_personal_message(
     #     updated_user.id,
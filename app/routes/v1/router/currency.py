@@ -1,33 +1,91 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
+from typing import List, Optional
 from app.models.currency import Currency
 from app.models.currency_lot import CurrencyLot, CurrencyLotLog
 from app.schemas.currency_lot import CurrencyLotOut, CurrencyLotCreate
-from app.schemas.currency import CurrencyCreate, CurrencyUpdate, CurrencyOut
-from app.dependencies import get_db
+from app.schemas.currency import (
+    CurrencyCreate,
+    CurrencyUpdate,
+    CurrencyOut,
+    CurrencyQuoteOut,
+)
+from app.dependencies import get_async_db, get_db
 from app.core.security import require_admin
-from app.core.websocket import manager
+from app.core.websocket import TOPIC_CURRENCIES, currency_topic
+from app.services.currency_service import (
+    currency_out,
+    get_currency_out,
+    list_currencies,
+    restock_currency,
+)
+from app.services.notification_service import queue_notification
+from app.services.quote_service import get_cost_curve, quote
+from app.services.transactions_service import service_sale_rate
+from app.models.service import Service
 from app.schemas.currency import CurrencyLotLogOut
 from app.models.users import User
 
 router = APIRouter()
 
 
+async def _currency_out(db: AsyncSession, currency: Currency) -> CurrencyOut:
+    # Currency.stock lazy-loads every lot; sum them in SQL instead.
+    stock = await db.scalar(
+        select(func.coalesce(func.sum(CurrencyLot.remaining_quantity), 0)).where(
+            CurrencyLot.currency_id == currency.id
+        )
+    )
+    return currency_out(currency, stock)
+
+
 @router.get("/currencies/get", response_model=List[CurrencyOut])
 def get_all_currencies(db: Session = Depends(get_db)):
-    return db.query(Currency).all()
+    return list_currencies(db)
 
 
 @router.get("/currencies/{currency_id}", response_model=CurrencyOut)
 def get_currency(currency_id: int, db: Session = Depends(get_db)):
-    currency = db.query(Currency).filter(Currency.id == currency_id).first()
+    currency = get_currency_out(db, currency_id)
     if not currency:
         raise HTTPException(status_code=404, detail="Currency not found")
     return currency
 
 
+@router.get("/{currency_id}/quote", response_model=CurrencyQuoteOut)
+def quote_currency(
+    currency_id: int,
+    amount: float = Query(..., gt=0),
+    service_id: Optional[int] = Query(None),
+    db: Session = Depends(get_db),
+):
+    """
+    Price a sale of `amount` units from the current FIFO lots without
+    allocating anything. With a service, its rate gives the LYD total and
+    the profit; without one only the cost is quoted.
+    """
+    curve = get_cost_curve(db, currency_id)
+    if curve is None:
+        raise HTTPException(status_code=404, detail="Currency not found")
+
+    sale_rate = None
+    operation = "multiply"
+    if service_id is not None:
+        service = db.get(Service, service_id)
+        if not service or not service.is_active or service.currency_id != currency_id:
+            raise HTTPException(status_code=404, detail="Service not found or inactive")
+        sale_rate = service_sale_rate(service)
+        operation = service.operation
+
+    try:
+        result = quote(curve, amount, sale_rate, operation)
+    except (ValueError, ZeroDivisionError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return CurrencyQuoteOut(currency_id=currency_id, service_id=service_id, **result)
+
+
 @router.get("/{currency_id}/lots", response_model=List[CurrencyLotOut])
 def get_currency_lots(currency_id: int, db: Session = Depends(get_db)):
     lots = (
@@ -48,23 +106,26 @@ def get_currency_lots(currency_id: int, db: Session = Depends(get_db)):
 )
 async def create_currency(
     currency_data: CurrencyCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     admin_user: User = Depends(require_admin),
 ):
     new_currency = Currency(**currency_data.dict())
     db.add(new_currency)
-    db.commit()
-    db.refresh(new_currency)
+    await db.flush()
 
-    # Broadcast to all users
-    await manager.broadcast(
+    # Notify everyone following the currencies, once committed
+    queue_notification(
+        db,
+        [TOPIC_CURRENCIES, currency_topic(new_currency.id)],
         {
             "type": "currency_created",
             "content": f"💱 تم إضافة عملة جديدة: {new_currency.name}",
-        }
+        },
     )
+    await db.commit()
+    await db.refresh(new_currency)
 
-    return new_currency
+    return await _currency_out(db, new_currency)
 
 
 @router.put(
@@ -75,28 +136,30 @@ async def create_currency(
 async def update_currency(
     currency_id: int,
     currency_data: CurrencyUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     admin_user: User = Depends(require_admin),
 ):
-    currency = db.query(Currency).filter(Currency.id == currency_id).first()
+    currency = await db.get(Currency, currency_id)
     if not currency:
         raise HTTPException(status_code=404, detail="Currency not found")
 
     for field, value in currency_data.dict(exclude_unset=True).items():
         setattr(currency, field, value)
 
-    db.commit()
-    db.refresh(currency)
-
-    # Broadcast to all users
-    await manager.broadcast(
+    # Notify everyone following the currencies, once committed
+    queue_notification(
+        db,
+        [TOPIC_CURRENCIES, currency_topic(currency.id)],
         {
             "type": "currency_updated",
             "content": f"💱 تم تحديث بيانات العملة: {currency.name}",
-        }
+        },
+        coalesce_key=f"currency_updated:{currency.id}",
     )
+    await db.commit()
+    await db.refresh(currency)
 
-    return currency
+    return await _currency_out(db, currency)
 
 
 @router.post(
@@ -107,98 +170,53 @@ async def update_currency(
 async def add_currency_lot(
     currency_id: int,
     lot_data: CurrencyLotCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     admin_user: User = Depends(require_admin),
 ):
-    currency = db.query(Currency).filter(Currency.id == currency_id).first()
+    currency = await db.get(Currency, currency_id)
     if not currency:
         raise HTTPException(status_code=404, detail="Currency not found")
 
-    # ✅ 1. حساب العجز الحالي في العملة (كمية سالبة)
-    total_deficit = (
-        db.query(func.sum(CurrencyLot.remaining_quantity))
-        .filter(
-            CurrencyLot.currency_id == currency_id, CurrencyLot.remaining_quantity < 0
-        )
-        .scalar()
-        or 0
-    )
-
-    total_deficit = abs(total_deficit)
-
-    # ✅ 2. خصم العجز من الكمية الجديدة
-    adjusted_remaining = lot_data.quantity - total_deficit
-    if adjusted_remaining < 0:
-        adjusted_remaining = 0
-
-    # ✅ 3. إنشاء الدفعة مع الكمية المعدلة
-    new_lot = CurrencyLot(
-        currency_id=currency_id,
-        quantity=lot_data.quantity,
-        remaining_quantity=adjusted_remaining,
-        cost_per_unit=lot_data.cost_per_unit,
+    # ✅ 1. إضافة الدفعة وتغطية العجز (الكميات السالبة) منها بالترتيب FIFO
+    new_lot = await db.run_sync(
+        restock_currency, currency_id, lot_data.quantity, lot_data.cost_per_unit
     )
-    db.add(new_lot)
-
-    # ✅ 4. تصفير الكميات السالبة من الـ lots السابقة (اختياري، لتكون أنظف)
-    negative_lots = (
-        db.query(CurrencyLot)
-        .filter(
-            CurrencyLot.currency_id == currency_id, CurrencyLot.remaining_quantity < 0
-        )
-        .order_by(CurrencyLot.created_at)
-    )
-
-    to_cover = total_deficit
-    for lot in negative_lots:
-        if to_cover <= 0:
-            break
-        fix = min(abs(lot.remaining_quantity), to_cover)
-        lot.remaining_quantity += fix
-        db.add(lot)
-        to_cover -= fix
-
-    db.commit()
-    db.refresh(new_lot)
 
-    # ✅ 5. بث إشعار
-    await manager.broadcast(
+    # ✅ 2. بث إشعار
+    queue_notification(
+        db,
+        [TOPIC_CURRENCIES, currency_topic(currency.id)],
         {
             "type": "currency_lot_added",
             "content": (
                 f"📦 تم إضافة دفعة جديدة للعملة {currency.name}: "
-                f"الكمية {lot_data.quantity} وحدة - المخزون الجديد {adjusted_remaining} وحدة"
+                f"الكمية {lot_data.quantity} وحدة - المخزون الجديد {new_lot.remaining_quantity} وحدة"
             ),
-        }
+        },
     )
 
+    await db.commit()
+    await db.refresh(new_lot)
+
     return new_lot
 
 
-@router.post("/add/{currency_id}/lots", response_model=CurrencyLotOut)
-def add_currency_lot(
+@router.post(
+    "/add/{currency_id}/lots",
+    response_model=CurrencyLotOut,
+    dependencies=[Depends(require_admin)],
+)
+def restock_currency_lot(
     currency_id: int,
     data: CurrencyLotCreate,
     db: Session = Depends(get_db),
+    admin_user: User = Depends(require_admin),
 ):
-    # 1) create the CurrencyLot as you do today
-    lot = CurrencyLot(
-        currency_id=currency_id,
-        quantity=data.quantity,
-        remaining_quantity=data.quantity,
-        cost_per_unit=data.cost_per_unit,
-    )
-    db.add(lot)
-    db.flush()  # so lot.id gets populated
-
-    # 2) now record the audit log
-    log = CurrencyLotLog(
-        lot_id=lot.id,
-        currency_id=currency_id,
-        quantity_added=data.quantity,
-        cost_per_unit=data.cost_per_unit,
-    )
-    db.add(log)
+    if db.get(Currency, currency_id) is None:
+        raise HTTPException(status_code=404, detail="Currency not found")
+
+    # Same path as the async route: the new lot covers the deficit first
+    lot = restock_currency(db, currency_id, data.quantity, data.cost_per_unit)
 
     db.commit()
     db.refresh(lot)
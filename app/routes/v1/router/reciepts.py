@@ -1,12 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from typing import Optional
 from sqlalchemy.orm import Session
 from app.models.receipt import ReceiptOrder
-from app.models.customers import Customer
-from app.models.treasury import Treasury
+from app.services.balance_service import TreasuryNotFound
+from app.services.reciept_service import create_receipt as record_receipt
 from app.schemas.receipt import ReceiptCreate, ReceiptOut
 from app.models.users import User
 from app.core.security import get_current_user
 from app.dependencies import get_db
+from app.services.idempotency_service import (
+    IDEMPOTENCY_HEADER,
+    REPLAYED_HEADER,
+    run_idempotent,
+)
 
 router = APIRouter()
 
@@ -14,27 +20,33 @@ router = APIRouter()
 @router.post("/create", response_model=ReceiptOut)
 def create_receipt(
     data: ReceiptCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(
+        None, alias=IDEMPOTENCY_HEADER, max_length=255
+    ),
     db: Session = Depends(get_db),
     employee: User = Depends(get_current_user),
 ):
-    customer = db.query(Customer).filter(Customer.id == data.customer_id).first()
-    if not customer:
-        raise HTTPException(status_code=404, detail="العميل غير موجود")
-
-    # خصم من مديونية العميل
-    customer.balance_due -= data.amount
+    result, replayed = run_idempotent(
+        db,
+        "receipts.create",
+        employee.id,
+        idempotency_key,
+        data,
+        lambda: ReceiptOut.model_validate(_create_receipt(db, data, employee)),
+    )
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return result
 
-    # زيادة رصيد الموظف
-    treasury = db.query(Treasury).filter_by(employee_id=employee.id).first()
-    treasury.balance += data.amount
 
-    receipt = ReceiptOrder(
-        customer_id=customer.id, amount=data.amount, employee_id=employee.id
-    )
-    db.add(receipt)
-    db.commit()
-    db.refresh(receipt)
-    return receipt
+def _create_receipt(db: Session, data: ReceiptCreate, employee: User) -> ReceiptOrder:
+    try:
+        return record_receipt(db, employee, data.customer_id, data.amount)
+    except TreasuryNotFound:
+        raise HTTPException(status_code=409, detail="لا توجد خزينة لهذا الموظف")
+    except ValueError:
+        raise HTTPException(status_code=404, detail="العميل غير موجود")
 
 
 @router.get("/get", response_model=list[ReceiptOut])
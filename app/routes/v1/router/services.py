@@ -1,12 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from app.dependencies import get_db
+from app.dependencies import get_async_db, get_db
 from app.core.security import require_admin
-from app.core.websocket import manager
+from app.core.websocket import TOPIC_SERVICES
 from app.models import Service, Country
 from app.models.users import User
 from app.schemas.service import ServiceUpdate, ServiceOut
+from app.services.notification_service import queue_notification
 from app.services.service_service import (
     delete_service,
     update_service,
@@ -73,19 +75,21 @@ def get_services_grouped_for_employee(db: Session = Depends(get_db)):
 async def edit_service(
     service_id: int,
     service_input: ServiceUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     admin_user: User = Depends(require_admin),
 ):
     """Admin-only: update service data."""
-    updated_service = update_service(db, service_id, service_input)
-
-    # Broadcast to all users
-    await manager.broadcast(
-        {
+    # Notify everyone following the service catalog, with the update's commit
+    queue_notification(
+        db,
+        [TOPIC_SERVICES],
+        lambda s: {
             "type": "service_updated",
-            "content": f"🔄 تم تعديل الخدمة: {updated_service.name}",
-        }
+            "content": f"🔄 تم تعديل الخدمة: {s.get(Service, service_id).name}",
+        },
+        coalesce_key=f"service_updated:{service_id}",
     )
+    updated_service = await db.run_sync(update_service, service_id, service_input)
 
     return updated_service
 
@@ -99,16 +103,18 @@ async def edit_service(
 )
 async def remove_service(
     service_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     admin_user: User = Depends(require_admin),
 ):
     """Admin-only: deactivate a service."""
-    delete_service(db, service_id)
-
-    # Broadcast to all users
-    await manager.broadcast(
-        {"type": "service_deleted", "content": f"🗑️ تم حذف الخدمة #{service_id}"}
+    # Notify everyone following the service catalog, with the delete's commit
+    queue_notification(
+        db,
+        [TOPIC_SERVICES],
+        {"type": "service_deleted", "content": f"🗑️ تم حذف الخدمة #{service_id}"},
+        coalesce_key=f"service_deleted:{service_id}",
     )
+    await db.run_sync(delete_service, service_id)
 
     return
 
@@ -122,18 +128,20 @@ async def remove_service(
 )
 async def activate_service_endpoint(
     service_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     admin_user: User = Depends(require_admin),
 ):
     """Admin-only: reactivate a service."""
-    activated_service = activate_service(db, service_id)
-
-    # Broadcast to all users
-    await manager.broadcast(
-        {
+    # Notify everyone following the service catalog, with the activation's commit
+    queue_notification(
+        db,
+        [TOPIC_SERVICES],
+        lambda s: {
             "type": "service_activated",
-            "content": f"✅ تم إعادة تفعيل الخدمة: {activated_service.name}",
-        }
+            "content": f"✅ تم إعادة تفعيل الخدمة: {s.get(Service, service_id).name}",
+        },
+        coalesce_key=f"service_activated:{service_id}",
     )
+    activated_service = await db.run_sync(activate_service, service_id)
 
     return activated_service
@@ -1,5 +1,7 @@
-from fastapi import APIRouter, Depends, Query, HTTPException, Request
+from fastapi import APIRouter, Depends, Header, Query, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 from datetime import datetime, date
 
@@ -7,11 +9,25 @@ from app.schemas.transactions import (
     TransactionCreate,
     TransactionOut,
     TransactionUpdate,
+    TransactionStatus,
+    TransactionBulkCreate,
+    TransactionBulkOut,
 )
 from app.models.transactions import Transaction
-from app.services.transactions_service import create_transaction, update_transaction
-from app.dependencies import get_db
+from app.services.transactions_service import (
+    create_transaction,
+    create_transactions_bulk,
+    update_transaction,
+)
+from app.services.idempotency_service import (
+    IDEMPOTENCY_HEADER,
+    REPLAYED_HEADER,
+    run_idempotent,
+)
+from app.services.export_service import csv_chunks, iter_report_batches, ndjson_chunks
+from app.dependencies import get_async_db, get_db
 from app.core.security import get_current_user, require_admin
+from app.core.pagination import NEXT_CURSOR_HEADER, keyset_page
 from app.core.websocket import manager
 from app.models.users import User
 
@@ -20,28 +36,83 @@ router = APIRouter()
 
 @router.get("/get", response_model=List[TransactionOut])
 def get_all_transactions(
+    response: Response,
+    cursor: Optional[str] = Query(
+        None, description="X-Next-Cursor of the previous page"
+    ),
+    limit: int = Query(50, ge=1, le=200),
     db: Session = Depends(get_db),
     current_admin=Depends(require_admin),
 ):
-    txs = (
-        db.query(Transaction)
-        .options(
-            joinedload(Transaction.employee),  # loads .employee.full_name
-            joinedload(Transaction.customer),  # loads .customer.name
-        )
-        .order_by(Transaction.created_at.desc())
-        .all()
+    query = db.query(Transaction).options(
+        joinedload(Transaction.employee),  # loads .employee.full_name
+        joinedload(Transaction.customer),  # loads .customer.name
     )
+    txs, next_cursor = keyset_page(
+        query, Transaction.created_at, Transaction.id, cursor, limit
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return txs
 
 
+@router.get("/export", summary="Stream the transaction history as NDJSON or CSV")
+def export_transactions(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    employee_id: Optional[int] = Query(None),
+    status: Optional[TransactionStatus] = Query(None),
+    current_admin=Depends(require_admin),
+):
+    batches = iter_report_batches(
+        start_date=start_date,
+        end_date=end_date,
+        employee_id=employee_id,
+        status=status,
+    )
+    if format == "csv":
+        return StreamingResponse(
+            csv_chunks(batches),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="transactions.csv"'},
+        )
+    return StreamingResponse(ndjson_chunks(batches), media_type="application/x-ndjson")
+
+
 @router.post("/create", response_model=TransactionOut)
 def sell_currency(
     data: TransactionCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(
+        None, alias=IDEMPOTENCY_HEADER, max_length=255
+    ),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    return create_transaction(db, data, current_user)
+    result, replayed = run_idempotent(
+        db,
+        "transactions.create",
+        current_user.id,
+        idempotency_key,
+        data,
+        lambda: TransactionOut.model_validate(
+            create_transaction(db, data, current_user)
+        ),
+    )
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return result
+
+
+@router.post("/bulk", response_model=TransactionBulkOut)
+def sell_currency_bulk(
+    data: TransactionBulkCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    created, errors = create_transactions_bulk(db, data.items, current_user)
+    return {"created": created, "errors": errors}
 
 
 @router.get(
@@ -66,7 +137,7 @@ async def api_update_transaction(
     tx_id: int,
     request: Request,
     data: TransactionUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_admin: User = Depends(require_admin),
 ):
     # You can still log raw payload if desired
@@ -75,8 +146,8 @@ async def api_update_transaction(
     print("✔️ Parsed model:", data)
 
     try:
-        txn = update_transaction(
-            db=db, txn_id=tx_id, data=data, modified_by=current_admin.id
+        txn = await db.run_sync(
+            update_transaction, txn_id=tx_id, data=data, modified_by=current_admin.id
         )
     except HTTPException:
         raise  # re-raise 404 or other errors
@@ -85,6 +156,11 @@ async def api_update_transaction(
 
 @router.get("/me", response_model=List[TransactionOut])
 def get_my_transactions(
+    response: Response,
+    cursor: Optional[str] = Query(
+        None, description="X-Next-Cursor of the previous page"
+    ),
+    limit: int = Query(50, ge=1, le=200),
     status: Optional[str] = Query(None),
     payment_type: Optional[str] = Query(None),
     start_date: Optional[date] = Query(None),
@@ -93,6 +169,9 @@ def get_my_transactions(
     current_user: User = Depends(get_current_user),
 ):
     query = db.query(Transaction).filter(Transaction.employee_id == current_user.id)
+    query = query.options(
+        joinedload(Transaction.employee), joinedload(Transaction.customer)
+    )
 
     if status:
         query = query.filter(Transaction.status == status)
@@ -103,4 +182,9 @@ def get_my_transactions(
         end_dt = datetime.combine(end_date, datetime.max.time())
         query = query.filter(Transaction.created_at.between(start_dt, end_dt))
 
-    return query.order_by(Transaction.created_at.desc()).all()
+    txs, next_cursor = keyset_page(
+        query, Transaction.created_at, Transaction.id, cursor, limit
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return txs
@@ -1,22 +1,171 @@
 # app/routes/ws_notifications.py
 import json
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
-from app.core.websocket import manager
+import time
+from typing import List, Optional
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from app.core.config import settings
+from app.core.security import decode_access_token, get_current_user, require_admin
+from app.core.websocket import DEFAULT_TOPICS, manager, topic_allowed, user_topic
+from app.db.session import AsyncSessionLocal
+from app.models.users import Role, User
+from app.schemas.notifications import LiveEventOut, LiveEventsPage
+from app.services.notification_service import latest_seq, wait_for_events
 
 router = APIRouter()
 
 
 @router.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: str):
-    await manager.connect(websocket, user_id)
+async def websocket_endpoint(
+    websocket: WebSocket,
+    user_id: str,
+    token: Optional[str] = Query(None),
+    last_seq: Optional[int] = Query(None),
+):
+    """
+    Live notifications. The socket follows its own user topic plus the
+    service and currency catalog; send
+    {"action": "subscribe" | "unsubscribe", "topics": [...]} to change that.
+    Pass the access token as `token` to be allowed onto the admin feed.
+    The server sends {"type": "ping"} periodically; reply with any message
+    (e.g. {"action": "pong"}) or the socket is closed as idle.
+
+    Every event carries a `seq`. Reconnect with the last one seen as
+    `last_seq` to receive only what was missed; {"type": "resync"} means
+    too much was missed and lists should be reloaded.
+    """
+    is_admin = False
+    if token is not None:
+        payload = decode_access_token(token)
+        if payload is None or payload.get("sub") != user_id:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        is_admin = payload.get("role") == Role.admin.value
+    connection = await manager.connect(websocket, user_id, is_admin=is_admin)
+    if last_seq is not None:
+        manager.replay(connection, connection.topics, last_seq)
     try:
         while True:
-            # Keep connection alive
-            await websocket.receive_text()
+            manager.handle_client_message(connection, await websocket.receive_text())
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket, user_id)
 
 
+@router.get("/metrics", dependencies=[Depends(require_admin)])
+async def live_metrics():
+    """Admin-only: WebSocket metrics for the worker that serves the request."""
+    return manager.metrics()
+
+
+def _poll_topics(user: User, topics: Optional[List[str]]) -> List[str]:
+    if not topics:
+        return [user_topic(user.id), *DEFAULT_TOPICS]
+    refused = [
+        t for t in topics if not topic_allowed(t, user.id, user.role == Role.admin)
+    ]
+    if refused:
+        raise HTTPException(
+            status_code=403, detail=f"Not allowed to follow: {', '.join(refused)}"
+        )
+    return topics
+
+
+async def _current_seq() -> int:
+    async with AsyncSessionLocal() as db:
+        return await latest_seq(db)
+
+
+async def _sse_chunks(topics: List[str], since: int, wait: float, limit: int):
+    """
+    Server-sent events until `wait` runs out. The client's EventSource then
+    reconnects with Last-Event-ID and carries on from there.
+    """
+    deadline = time.monotonic() + wait
+    yield "retry: 1000\n\n"
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        events, resync = await wait_for_events(topics, since, min(remaining, 15), limit)
+        if resync:
+            since = await _current_seq()
+            yield f"id: {since}\nevent: resync\ndata: {{}}\n\n"
+        elif not events:
+            yield ": keep-alive\n\n"
+        for event in events:
+            since = event.seq
+            data = json.dumps({**event.payload, "seq": event.seq})
+            yield f"id: {event.seq}\ndata: {data}\n\n"
+
+
+@router.get("/events", response_model=LiveEventsPage)
+async def poll_events(
+    request: Request,
+    since: Optional[int] = Query(
+        None, ge=0, description="Last seq seen; omit to start from now"
+    ),
+    wait: float = Query(
+        20,
+        ge=0,
+        le=settings.LIVE_POLL_MAX_WAIT_SECONDS,
+        description="Seconds to wait for a new event before answering empty",
+    ),
+    topics: Optional[List[str]] = Query(
+        None, description="Defaults to your own user topic, services and currencies"
+    ),
+    limit: int = Query(100, ge=1, le=500),
+    last_event_id: Optional[int] = Header(None, alias="Last-Event-ID"),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Live notifications for clients that can't keep a WebSocket open (e.g. on
+    serverless hosting): the same events, numbered by the same `seq`.
+
+    Long-poll by default: answers as soon as there are events after `since`,
+    or empty after `wait` seconds; poll again with `since=next`. With
+    `Accept: text/event-stream` the events are streamed as server-sent events
+    instead, resuming from Last-Event-ID.
+    """
+    topics = _poll_topics(current_user, topics)
+    # Where no dispatcher has been running (serverless), deliver what is
+    # already committed before reading.
+    await manager.dispatch_outbox()
+    stream = "text/event-stream" in request.headers.get("accept", "")
+    if last_event_id is not None:
+        since = last_event_id
+    if since is None:
+        since = await _current_seq()
+        if not stream:
+            return LiveEventsPage(events=[], next=since)
+
+    if stream:
+        return StreamingResponse(
+            _sse_chunks(topics, since, wait, limit),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    events, resync = await wait_for_events(topics, since, wait, limit)
+    if resync:
+        return LiveEventsPage(events=[], next=await _current_seq(), resync=True)
+    return LiveEventsPage(
+        events=[LiveEventOut.model_validate(e) for e in events],
+        next=events[-1].seq if events else since,
+    )
+
+
 # Test endpoints
 @router.post("/notify/{user_id}")
 async def notify_user(user_id: str, message: str):
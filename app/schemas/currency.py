@@ -25,6 +25,18 @@ class CurrencyOut(BaseModel):
         from_attributes = True
 
 
+class CurrencyQuoteOut(BaseModel):
+    currency_id: int
+    service_id: Optional[int] = None
+    amount: float
+    available: float
+    shortfall: float
+    total_cost: float
+    avg_cost: float
+    total_sale: Optional[float] = None
+    profit: Optional[float] = None
+
+
 class CurrencyLotLogOut(BaseModel):
     id: int
     lot_id: int
@@ -0,0 +1,21 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel
+
+
+class LiveEventOut(BaseModel):
+    seq: int
+    topics: Optional[List[str]] = None
+    payload: dict
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class LiveEventsPage(BaseModel):
+    events: List[LiveEventOut]
+    # Pass back as `since` on the next poll.
+    next: int
+    # Events after `since` are no longer kept; reload lists, then poll from `next`.
+    resync: bool = False
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from datetime import datetime
 from enum import Enum
 
@@ -57,3 +57,17 @@ class TransactionOut(TransactionCreate):
 
     class Config:
         from_attributes = True
+
+
+class TransactionBulkCreate(BaseModel):
+    items: List[TransactionCreate] = Field(..., min_length=1, max_length=500)
+
+
+class TransactionBulkError(BaseModel):
+    index: int
+    detail: str
+
+
+class TransactionBulkOut(BaseModel):
+    created: List[TransactionOut]
+    errors: List[TransactionBulkError]
@@ -0,0 +1,124 @@
+"""
+Login throughput benchmark for the password-hashing pool.
+
+Creates a throwaway user in the database pointed to by DATABASE_URI (use a
+local Postgres, never production), fires concurrent logins at the /login
+handler and reports throughput, 503 rejections and how late a 10 ms event
+loop ticker ran meanwhile, which is what other requests would feel.
+
+    PYTHONPATH=. python app/scripts/bench_login.py --concurrency 32 --logins 200
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from types import SimpleNamespace
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.hashing import hash_password, shutdown_hashing_executor
+from app.db.session import AsyncSessionLocal, SessionLocal
+from app.models.users import User
+from app.routes.v1.router.auth import login
+
+PASSWORD = "bench-password"
+
+
+def create_user() -> str:
+    db = SessionLocal()
+    try:
+        username = f"bench-{uuid.uuid4().hex[:8]}"
+        db.add(
+            User(
+                username=username,
+                full_name="Login Benchmark",
+                hashed_password=hash_password(PASSWORD),
+                role="employee",
+            )
+        )
+        db.commit()
+        return username
+    finally:
+        db.close()
+
+
+def delete_user(username: str) -> None:
+    db = SessionLocal()
+    try:
+        db.query(User).filter(User.username == username).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+async def ticker(lags: list, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - started - 0.01)
+
+
+async def run(username: str, concurrency: int, logins: int) -> dict:
+    form = SimpleNamespace(username=username, password=PASSWORD)
+    queue = iter(range(logins))
+    counts = {"ok": 0, "rejected": 0, "failed": 0}
+
+    async def worker():
+        for _ in queue:
+            async with AsyncSessionLocal() as db:
+                try:
+                    await login(form_data=form, db=db)
+                    counts["ok"] += 1
+                except HTTPException as exc:
+                    counts["rejected" if exc.status_code == 503 else "failed"] += 1
+
+    lags: list = []
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    counts["elapsed"] = time.perf_counter() - started
+    stop.set()
+    await tick
+    lags.sort()
+    counts["lag_p50"] = lags[len(lags) // 2] if lags else 0.0
+    counts["lag_max"] = lags[-1] if lags else 0.0
+    return counts
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--logins", type=int, default=100)
+    args = parser.parse_args()
+
+    username = create_user()
+    try:
+        result = asyncio.run(run(username, args.concurrency, args.logins))
+    finally:
+        delete_user(username)
+        shutdown_hashing_executor()
+
+    elapsed = result["elapsed"]
+    print(
+        f"pool:       {settings.PASSWORD_HASH_WORKERS} workers, "
+        f"{settings.PASSWORD_HASH_MAX_PENDING} max pending, "
+        f"{settings.BCRYPT_ROUNDS} rounds"
+    )
+    print(
+        f"logins:     {result['ok']} ok, {result['rejected']} rejected (503), "
+        f"{result['failed']} failed in {elapsed:.2f}s"
+    )
+    print(f"throughput: {result['ok'] / elapsed:.1f} logins/s")
+    print(
+        f"loop lag:   p50 {result['lag_p50'] * 1000:.1f} ms, "
+        f"max {result['lag_max'] * 1000:.1f} ms"
+    )
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
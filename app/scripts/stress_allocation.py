@@ -0,0 +1,135 @@
+"""
+Multi-threaded stress check for concurrent lot allocation.
+
+Runs many parallel sales of the same currency against the database pointed to
+by DATABASE_URI (use a local Postgres, never production) and verifies that no
+units are lost: every unit allocated must be missing from the lots, and no
+lot may go negative while other lots still hold stock.
+
+    PYTHONPATH=. python app/scripts/stress_allocation.py --threads 16 --sales 50
+"""
+
+import argparse
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.currency import Currency
+from app.models.currency_lot import CurrencyLot
+from app.services.allocate_currency import allocate_currency_lots
+
+
+def setup_currency(lots: int, lot_size: int) -> int:
+    db = SessionLocal()
+    try:
+        currency = Currency(name=f"STRESS-{uuid.uuid4().hex[:8]}", symbol="S")
+        db.add(currency)
+        db.flush()
+        start = datetime.utcnow()
+        for i in range(lots):
+            db.add(
+                CurrencyLot(
+                    currency_id=currency.id,
+                    quantity=lot_size,
+                    remaining_quantity=lot_size,
+                    cost_per_unit=1.0 + i / 100,
+                    created_at=start + timedelta(microseconds=i),
+                )
+            )
+        db.commit()
+        return currency.id
+    finally:
+        db.close()
+
+
+def sell(currency_id: int, sales: int, amount: int, allocated: list, errors: list):
+    db = SessionLocal()
+    try:
+        for _ in range(sales):
+            try:
+                currency = db.get(Currency, currency_id)
+                allocations = allocate_currency_lots(db, currency, amount)
+                db.commit()
+                allocated.append(sum(qty for _, qty in allocations))
+            except Exception as exc:  # keep the other workers going
+                db.rollback()
+                errors.append(repr(exc))
+    finally:
+        db.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--sales", type=int, default=50, help="sales per thread")
+    parser.add_argument("--amount", type=int, default=3, help="units per sale")
+    parser.add_argument("--lots", type=int, default=40)
+    parser.add_argument("--lot-size", type=int, default=25)
+    parser.add_argument("--keep", action="store_true", help="keep the test data")
+    args = parser.parse_args()
+
+    currency_id = setup_currency(args.lots, args.lot_size)
+    initial = args.lots * args.lot_size
+    allocated: list = []
+    errors: list = []
+
+    threads = [
+        threading.Thread(
+            target=sell, args=(currency_id, args.sales, args.amount, allocated, errors)
+        )
+        for _ in range(args.threads)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    db = SessionLocal()
+    try:
+        remaining = (
+            db.query(func.sum(CurrencyLot.remaining_quantity))
+            .filter(CurrencyLot.currency_id == currency_id)
+            .scalar()
+        )
+        negative_with_stock = 0
+        if remaining > 0:
+            negative_with_stock = (
+                db.query(func.count(CurrencyLot.id))
+                .filter(
+                    CurrencyLot.currency_id == currency_id,
+                    CurrencyLot.remaining_quantity < 0,
+                )
+                .scalar()
+            )
+        if not args.keep:
+            db.query(Currency).filter(Currency.id == currency_id).delete()
+            db.commit()
+    finally:
+        db.close()
+
+    sold = sum(allocated)
+    print(f"mode:       {settings.LOT_ALLOCATION_LOCK_MODE}")
+    print(f"sales:      {len(allocated)} ok, {len(errors)} failed in {elapsed:.2f}s")
+    print(f"throughput: {len(allocated) / elapsed:.1f} sales/s")
+    print(f"stock:      {initial} initial, {sold} sold, {remaining} remaining")
+    for err in errors[:5]:
+        print(f"error:      {err}")
+
+    lost = initial - sold - remaining
+    if abs(lost) > 1e-6 or negative_with_stock:
+        print(f"FAILED: {lost} units lost, {negative_with_stock} oversold lots")
+        return 1
+    print("OK: no units lost")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,94 @@
+import asyncio
+import random
+import time
 from fastapi import HTTPException
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
+from sqlalchemy.util.concurrency import await_only, in_greenlet
+from app.core.config import settings
 from app.models.currency import Currency
-from typing import Dict
+from app.models.currency_lot import CurrencyLot
+from app.services.cost_engine import LotSlice, compute_cost_report
+from typing import Dict, List
 from app.logger import Logger
 
 logger = Logger.get_logger(__name__)
 
 
-def allocate_currency_lots(db: Session, currency: Currency, needed_amount: float):
+FIFO_BATCH_SIZE = 20
+
+# First key of the two-key pg_advisory_xact_lock used by the "advisory" mode;
+# the second key is the currency id.
+ADVISORY_LOCK_NAMESPACE = 0x4C4F54  # "LOT"
+
+# Postgres SQLSTATEs worth retrying: deadlock_detected, lock_not_available,
+# serialization_failure.
+RETRYABLE_PGCODES = {"40P01", "55P03", "40001"}
+
+
+class LotContentionError(Exception):
+    """Open lots of the currency are locked by concurrent allocations."""
+
+
+def _iter_open_lots(
+    db: Session,
+    currency_id: int,
+    lock: str | None = None,
+    batch_size: int = FIFO_BATCH_SIZE,
+):
     """
-    FIFO allocate up to needed_amount. If you run out of positive stock,
-    the remainder is taken (as a negative) from the *newest* lot, letting
-    remaining_quantity go negative.
+    Yield the currency's lots that still hold stock, oldest first.
+
+    Lots are fetched in small keyset batches on (created_at, id) so that only
+    the lots actually consumed by an allocation are read, no matter how many
+    used-up lots the currency has accumulated.
+
+    lock=None reads plain rows, "skip_locked" row-locks them and skips lots
+    held by other transactions, "wait" row-locks them and blocks on busy ones.
     """
+    last_key = None
+    while True:
+        query = db.query(CurrencyLot).filter(
+            CurrencyLot.currency_id == currency_id,
+            CurrencyLot.remaining_quantity > 0,
+        )
+        if last_key is not None:
+            query = query.filter(
+                tuple_(CurrencyLot.created_at, CurrencyLot.id) > last_key
+            )
+        if lock is not None:
+            query = query.with_for_update(
+                skip_locked=lock == "skip_locked"
+            ).populate_existing()
+        batch = (
+            query.order_by(CurrencyLot.created_at, CurrencyLot.id)
+            .limit(batch_size)
+            .all()
+        )
+        yield from batch
+        # A locked read can come back short when rows change under it while
+        # we wait, so only an empty batch proves the queue is exhausted.
+        if not batch or (lock is None and len(batch) < batch_size):
+            return
+        last_key = (batch[-1].created_at, batch[-1].id)
+
+
+def _newest_lot(db: Session, currency_id: int, lock: str | None = None):
+    query = db.query(CurrencyLot).filter(CurrencyLot.currency_id == currency_id)
+    if lock is not None:
+        query = query.with_for_update().populate_existing()
+    return query.order_by(CurrencyLot.created_at.desc(), CurrencyLot.id.desc()).first()
+
+
+def _allocate(db: Session, currency_id: int, needed_amount: float, lock=None):
     remaining = needed_amount
     allocations = []
+    # Locked reads refresh rows from the database; push pending changes first
+    # so they are not overwritten.
+    db.flush()
 
-    lots = sorted(currency.lots, key=lambda l: l.created_at)
-    for lot in lots:
-        if lot.remaining_quantity <= 0:
-            continue
+    for lot in _iter_open_lots(db, currency_id, lock):
         take = min(lot.remaining_quantity, remaining)
         allocations.append((lot, take))
         lot.remaining_quantity -= take
@@ -29,11 +98,28 @@ def allocate_currency_lots(db: Session, currency: Currency, needed_amount: float
             break
 
     if remaining > 0:
-        if not lots:
+        db.flush()
+        if lock == "skip_locked":
+            # Stock may still exist in lots another sale holds right now;
+            # only go negative once we know nothing open is left.
+            taken_ids = [lot.id for lot, _ in allocations]
+            contended = (
+                db.query(CurrencyLot.id)
+                .filter(
+                    CurrencyLot.currency_id == currency_id,
+                    CurrencyLot.remaining_quantity > 0,
+                    CurrencyLot.id.notin_(taken_ids),
+                )
+                .first()
+            )
+            if contended:
+                raise LotContentionError(currency_id)
+
+        newest = _newest_lot(db, currency_id, lock)
+        if newest is None:
             raise HTTPException(
                 status_code=400, detail="No currency lots exist to allocate from"
             )
-        newest = lots[-1]
         allocations.append((newest, remaining))
         newest.remaining_quantity -= remaining
         db.add(newest)
@@ -42,6 +128,75 @@ def allocate_currency_lots(db: Session, currency: Currency, needed_amount: float
     return allocations
 
 
+def _sleep(seconds: float) -> None:
+    # Async routes allocate through AsyncSession.run_sync, i.e. on the event
+    # loop's thread; yield to the loop there instead of blocking the worker.
+    if in_greenlet():
+        await_only(asyncio.sleep(seconds))
+    else:
+        time.sleep(seconds)
+
+
+def _is_retryable(exc: OperationalError) -> bool:
+    # psycopg2 exposes the SQLSTATE as pgcode, psycopg 3 as sqlstate
+    code = getattr(exc.orig, "pgcode", None) or getattr(exc.orig, "sqlstate", None)
+    return code in RETRYABLE_PGCODES
+
+
+def allocate_currency_lots(db: Session, currency: Currency, needed_amount: float):
+    """
+    FIFO allocate up to needed_amount. If you run out of positive stock,
+    the remainder is taken (as a negative) from the *newest* lot, letting
+    remaining_quantity go negative.
+
+    Concurrent sales are coordinated according to LOT_ALLOCATION_LOCK_MODE:
+    - "skip_locked": lots are row-locked with FOR UPDATE SKIP LOCKED so that
+      parallel sales consume different lots. Each attempt runs in a savepoint;
+      when the only stock left sits in lots held by another sale, the attempt
+      is rolled back and retried, and the last attempt waits for the locks.
+    - "advisory": a per-currency transaction advisory lock serialises sales
+      of that currency only.
+    - "none": no coordination (single-writer deployments).
+    """
+    mode = settings.LOT_ALLOCATION_LOCK_MODE
+    if mode == "none":
+        return _allocate(db, currency.id, needed_amount)
+
+    if mode == "advisory":
+        db.execute(
+            select(func.pg_advisory_xact_lock(ADVISORY_LOCK_NAMESPACE, currency.id))
+        )
+        return _allocate(db, currency.id, needed_amount, lock="wait")
+
+    attempts = settings.LOT_ALLOCATION_MAX_RETRIES + 1
+    for attempt in range(1, attempts + 1):
+        lock = "skip_locked" if attempt < attempts else "wait"
+        savepoint = db.begin_nested()
+        try:
+            allocations = _allocate(db, currency.id, needed_amount, lock)
+        except (LotContentionError, OperationalError) as exc:
+            savepoint.rollback()
+            if isinstance(exc, OperationalError) and not _is_retryable(exc):
+                raise
+            if attempt == attempts:
+                raise
+            logger.info(
+                "Lot contention on currency %s (attempt %s/%s): %s",
+                currency.id,
+                attempt,
+                attempts,
+                type(exc).__name__,
+            )
+            backoff = settings.LOT_ALLOCATION_RETRY_BACKOFF_MS * attempt / 1000
+            _sleep(backoff * random.uniform(0.5, 1.5))
+            continue
+        except Exception:
+            savepoint.rollback()
+            raise
+        savepoint.commit()
+        return allocations
+
+
 def allocate_and_compute(
     db: Session,
     currency: Currency,
@@ -56,56 +211,49 @@ def allocate_and_compute(
     """
     allocations = allocate_currency_lots(db, currency, needed_amount)
 
-    breakdown = []
-    total_cost = 0.0
     for lot, qty in allocations:
-        if operation == "multiply":
-            cost = lot.cost_per_unit * qty
-        elif operation == "divide":
-            cost = qty / lot.cost_per_unit
-        elif operation == "pluse":
-            cost = qty
-        breakdown.append(
-            {
-                "lot_id": lot.id,
-                "unit_cost": lot.cost_per_unit,
-                "quantity": qty,
-                "cost": round(cost, 2),
-            }
-        )
         logger.info(
             "Allocated %s from lot %s (remaining: %s)",
             qty,
             lot.id,
             lot.remaining_quantity,
         )
-        logger.info("Cost for this lot: %s", cost)
-        total_cost += cost
-
-    if operation == "multiply":
-        total_sale = round(needed_amount * sale_rate, 2)
-        profit = round(total_sale - total_cost, 2)
-        logger.info("Total sale (multiply): %s", total_sale)
-        logger.info("Total profit: %s", profit)
-    elif operation == "divide":
-        total_sale = round(needed_amount / sale_rate, 2)
-        profit = round(total_sale - total_cost, 2)
-        logger.info("Total sale (divide): %s", total_sale)
-        logger.info("Total profit: %s", profit)
-    elif operation == "pluse":
-        total_sale = needed_amount
-        profit = total_sale - total_cost
-        logger.info("Total sale (pluse): %s", total_sale)
-        logger.info("Total profit: %s", profit)
-    else:
-        raise ValueError(f"Unsupported operation: {operation}")
 
-    logger.info("Total profit: %s", profit)
+    report = compute_cost_report(
+        [(lot.id, qty, lot.cost_per_unit) for lot, qty in allocations],
+        needed_amount,
+        sale_rate,
+        operation,
+    )
+    logger.info(
+        "Total sale (%s): %s, cost: %s, profit: %s",
+        operation,
+        report["total_sale"],
+        report["total_cost"],
+        report["profit"],
+    )
+    return report
 
-    return {
-        "breakdown": breakdown,
-        "total_cost": round(total_cost, 2),
-        "avg_cost": round(total_cost / needed_amount, 4) if needed_amount else 0.0,
-        "total_sale": total_sale,
-        "profit": profit,
-    }
+
+def split_allocations(allocations, amounts: List[float]) -> List[List[LotSlice]]:
+    """
+    Divide one FIFO allocation covering sum(amounts) between consecutive
+    sales, in order: the first sale gets the oldest slices, and a lot that
+    straddles two sales is shared between them.
+    """
+    slices = [[lot.id, qty, lot.cost_per_unit] for lot, qty in allocations]
+    result = []
+    i = 0
+    for amount in amounts:
+        needed = amount
+        own: List[LotSlice] = []
+        while needed > 1e-9 and i < len(slices):
+            lot_id, available, unit_cost = slices[i]
+            take = min(available, needed)
+            own.append((lot_id, take, unit_cost))
+            needed -= take
+            slices[i][1] -= take
+            if slices[i][1] <= 1e-9:
+                i += 1
+        result.append(own)
+    return result
@@ -1,15 +1,19 @@
+from typing import Optional
 from fastapi import HTTPException
 from app.models.users import User, Role
 from app.schemas.users import UserCreate
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
 from app.models.treasury import Treasury
+from app.core.hashing import hash_password
+from app.core.security import IDENTITY_CACHE
+from app.core.websocket import manager
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-
-def create_user(db: Session, user_data: UserCreate):
-    hashed_password = pwd_context.hash(user_data.password)
+def create_user(
+    db: Session, user_data: UserCreate, hashed_password: Optional[str] = None
+):
+    """`hashed_password` lets async callers hash beforehand off the event loop."""
+    hashed_password = hashed_password or hash_password(user_data.password)
     user = User(
         username=user_data.username,
         full_name=user_data.full_name,
@@ -26,16 +30,18 @@ def create_user(db: Session, user_data: UserCreate):
     return user
 
 
-def update_user_password(db: Session, user_id: int, new_password: str) -> User:
+def update_user_password(
+    db: Session, user_id: int, new_password: str, hashed: Optional[str] = None
+) -> User:
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    hashed = pwd_context.hash(new_password)
-    user.hashed_password = hashed
+    user.hashed_password = hashed or hash_password(new_password)
 
     db.add(user)
     db.commit()
+    manager.invalidate_everywhere(IDENTITY_CACHE, user_id)
     db.refresh(user)
     return user
 
@@ -47,6 +53,7 @@ def update_user_role(db: Session, user_id: int, new_role: Role):
 
     user.role = new_role
     db.commit()
+    manager.invalidate_everywhere(IDENTITY_CACHE, user_id)
     db.refresh(user)
     return user
 
@@ -58,5 +65,6 @@ def update_user_full_name(db: Session, user_id: int, new_full_name: str) -> User
 
     user.full_name = new_full_name
     db.commit()
+    manager.invalidate_everywhere(IDENTITY_CACHE, user_id)
     db.refresh(user)
     return user
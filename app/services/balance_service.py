@@ -0,0 +1,64 @@
+from typing import Optional
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+from app.models.customers import Customer
+from app.models.treasury import Treasury
+from app.logger import Logger
+
+logger = Logger.get_logger(__name__)
+
+# Balances are only ever changed with a single UPDATE ... SET x = x + :delta
+# RETURNING x: one round trip, and the row lock taken by the UPDATE makes
+# concurrent deltas add up instead of overwriting each other. When one DB
+# transaction changes several balances it takes treasuries (by employee id)
+# before customers, so two such transactions can't deadlock.
+
+
+class TreasuryNotFound(ValueError):
+    """The employee has no treasury row to change."""
+
+
+def adjust_treasury_balance(db: Session, employee_id: int, delta: float) -> float:
+    """Add `delta` to an employee's treasury and return the new balance."""
+    balance = db.execute(
+        update(Treasury)
+        .where(Treasury.employee_id == employee_id)
+        .values(balance=func.coalesce(Treasury.balance, 0) + delta)
+        .returning(Treasury.balance)
+    ).scalar_one_or_none()
+    if balance is None:
+        raise TreasuryNotFound(f"Treasury not found for employee {employee_id}")
+    return balance
+
+
+def debit_treasury_balance(
+    db: Session, employee_id: int, amount: float
+) -> Optional[float]:
+    """
+    Take `amount` from an employee's treasury only if it holds enough.
+    Returns the new balance, or None when the balance is insufficient.
+    """
+    return db.execute(
+        update(Treasury)
+        .where(
+            Treasury.employee_id == employee_id,
+            func.coalesce(Treasury.balance, 0) >= amount,
+        )
+        .values(balance=func.coalesce(Treasury.balance, 0) - amount)
+        .returning(Treasury.balance)
+    ).scalar_one_or_none()
+
+
+def adjust_customer_balance(
+    db: Session, customer_id: int, delta: float
+) -> Optional[float]:
+    """
+    Add `delta` to a customer's balance_due. Returns the new balance, or None
+    if the customer doesn't exist.
+    """
+    return db.execute(
+        update(Customer)
+        .where(Customer.id == customer_id)
+        .values(balance_due=func.coalesce(Customer.balance_due, 0) + delta)
+        .returning(Customer.balance_due)
+    ).scalar_one_or_none()
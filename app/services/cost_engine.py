@@ -0,0 +1,67 @@
+from typing import Dict, Iterable, Tuple
+
+# (lot_id, quantity, cost_per_unit)
+LotSlice = Tuple[int, float, float]
+
+
+def lot_cost(operation: str, quantity: float, unit_cost: float) -> float:
+    """Cost in LYD of `quantity` foreign units bought at `unit_cost`."""
+    if operation == "multiply":
+        return unit_cost * quantity
+    elif operation == "divide":
+        return quantity / unit_cost
+    elif operation == "pluse":
+        return quantity
+    raise ValueError(f"Unsupported operation: {operation}")
+
+
+def sale_total(amount_foreign: float, sale_rate: float, operation: str) -> float:
+    """LYD collected for `amount_foreign` units sold at `sale_rate`."""
+    if operation == "multiply":
+        return round(amount_foreign * sale_rate, 2)
+    elif operation == "divide":
+        return round(amount_foreign / sale_rate, 2)
+    elif operation == "pluse":
+        return amount_foreign
+    raise ValueError(f"Unsupported operation: {operation}")
+
+
+def compute_cost_report(
+    slices: Iterable[LotSlice],
+    needed_amount: float,
+    sale_rate: float,
+    operation: str,
+) -> Dict:
+    """
+    Cost and profit of a sale from the lot slices it consumed.
+
+    Pure: takes the (lot_id, quantity, cost_per_unit) breakdown and never
+    touches the database, so it can price a stored sale as well as a new one.
+    Returns the same shape as allocate_and_compute.
+    """
+    breakdown = []
+    total_cost = 0.0
+    for lot_id, qty, unit_cost in slices:
+        cost = lot_cost(operation, qty, unit_cost)
+        breakdown.append(
+            {
+                "lot_id": lot_id,
+                "unit_cost": unit_cost,
+                "quantity": qty,
+                "cost": round(cost, 2),
+            }
+        )
+        total_cost += cost
+
+    total_sale = sale_total(needed_amount, sale_rate, operation)
+    profit = total_sale - total_cost
+    if operation != "pluse":
+        profit = round(profit, 2)
+
+    return {
+        "breakdown": breakdown,
+        "total_cost": round(total_cost, 2),
+        "avg_cost": round(total_cost / needed_amount, 4) if needed_amount else 0.0,
+        "total_sale": total_sale,
+        "profit": profit,
+    }
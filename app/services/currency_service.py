@@ -0,0 +1,139 @@
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import Select, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.currency import Currency
+from app.models.currency_lot import CurrencyLot, CurrencyLotLog
+from app.schemas.currency import CurrencyOut
+from app.services.allocate_currency import ADVISORY_LOCK_NAMESPACE
+from app.services.quote_service import mark_lots_changed
+
+
+def currencies_with_stock() -> Select:
+    """
+    (Currency, stock) rows, with stock summed over each currency's lots by
+    one GROUP BY instead of Currency.stock loading every lot.
+    """
+    stock = (
+        select(
+            CurrencyLot.currency_id,
+            func.sum(CurrencyLot.remaining_quantity).label("stock"),
+        )
+        .group_by(CurrencyLot.currency_id)
+        .subquery()
+    )
+    return (
+        select(Currency, func.coalesce(stock.c.stock, 0).label("stock"))
+        .outerjoin(stock, stock.c.currency_id == Currency.id)
+        .order_by(Currency.id)
+    )
+
+
+def currency_out(currency: Currency, stock: float) -> CurrencyOut:
+    return CurrencyOut(
+        id=currency.id,
+        name=currency.name,
+        symbol=currency.symbol,
+        is_active=currency.is_active,
+        stock=stock,
+    )
+
+
+def list_currencies(db: Session) -> List[CurrencyOut]:
+    return [currency_out(*row) for row in db.execute(currencies_with_stock())]
+
+
+def get_currency_out(db: Session, currency_id: int) -> Optional[CurrencyOut]:
+    row = db.execute(currencies_with_stock().where(Currency.id == currency_id)).first()
+    return currency_out(*row) if row else None
+
+
+def restock_currency(
+    db: Session, currency_id: int, quantity: float, cost_per_unit: float
+) -> CurrencyLot:
+    """
+    Add a lot of `quantity` units and use it to cover the currency's deficit.
+
+    Lots driven negative by overselling are paid back oldest first, up to
+    `quantity` in total, and the new lot keeps whatever is left over. The
+    cover, the new lot and its CurrencyLotLog row are written by a single
+    statement: a running sum over the negative lots decides how much each
+    one gets, so the number of round trips does not depend on how many
+    negative lots there are. Not committed.
+    """
+    if settings.LOT_ALLOCATION_LOCK_MODE == "advisory":
+        db.execute(
+            select(func.pg_advisory_xact_lock(ADVISORY_LOCK_NAMESPACE, currency_id))
+        )
+    mark_lots_changed(db, currency_id)
+    now = datetime.utcnow()
+
+    # Row-lock the negative lots so a concurrent sale cannot deepen one
+    # between reading and covering it.
+    negative = (
+        select(CurrencyLot.id, CurrencyLot.remaining_quantity, CurrencyLot.created_at)
+        .where(
+            CurrencyLot.currency_id == currency_id,
+            CurrencyLot.remaining_quantity < 0,
+        )
+        .with_for_update()
+        .subquery("negative")
+    )
+    owed = (
+        select(
+            negative.c.id,
+            (-negative.c.remaining_quantity).label("owed"),
+            func.sum(-negative.c.remaining_quantity)
+            .over(order_by=(negative.c.created_at, negative.c.id))
+            .label("owed_through"),
+        )
+    ).cte("owed")
+    owed_before = owed.c.owed_through - owed.c.owed
+    fix = func.least(owed.c.owed, quantity - owed_before)
+    covered = (
+        update(CurrencyLot)
+        .where(CurrencyLot.id == owed.c.id, owed_before < quantity)
+        .values(remaining_quantity=CurrencyLot.remaining_quantity + fix)
+        .returning(fix.label("fix"))
+        .cte("covered")
+    )
+    new_lot = (
+        insert(CurrencyLot)
+        .from_select(
+            [
+                "currency_id",
+                "quantity",
+                "remaining_quantity",
+                "cost_per_unit",
+                "created_at",
+            ],
+            select(
+                literal(currency_id),
+                literal(quantity),
+                literal(quantity)
+                - select(func.coalesce(func.sum(covered.c.fix), 0)).scalar_subquery(),
+                literal(cost_per_unit),
+                literal(now),
+            ),
+        )
+        .returning(*CurrencyLot.__table__.c)
+        .cte("new_lot")
+    )
+    log = (
+        insert(CurrencyLotLog)
+        .from_select(
+            ["lot_id", "currency_id", "quantity_added", "cost_per_unit", "created_at"],
+            select(
+                new_lot.c.id,
+                new_lot.c.currency_id,
+                new_lot.c.quantity,
+                new_lot.c.cost_per_unit,
+                new_lot.c.created_at,
+            ),
+        )
+        .cte("log")
+    )
+    return db.scalars(
+        select(CurrencyLot).from_statement(select(*new_lot.c).add_cte(log))
+    ).one()
@@ -0,0 +1,211 @@
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional, Tuple
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.idempotency_key import IdempotencyKey
+from app.logger import Logger
+
+logger = Logger.get_logger(__name__)
+
+# Header clients send to make a POST safe to retry.
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+# Response header set when the body is a replay of the first response.
+REPLAYED_HEADER = "Idempotent-Replayed"
+# How long, and how often, a duplicate polls for the response of the
+# request that claimed its key.
+REPLAY_WAIT_SECONDS = 5.0
+REPLAY_POLL_SECONDS = 0.02
+
+
+def request_fingerprint(request: Any) -> str:
+    body = json.dumps(jsonable_encoder(request), sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def load_response(
+    db: Session, scope: str, user_id: int, key: str, fingerprint: str
+) -> Optional[dict]:
+    """
+    The stored response for this key, or None if there is none yet (or it
+    expired, or its request has not stored it yet). A key reused for a
+    different request is rejected.
+    """
+    stored = db.execute(
+        select(IdempotencyKey.request_hash, IdempotencyKey.response).where(
+            IdempotencyKey.scope == scope,
+            IdempotencyKey.user_id == user_id,
+            IdempotencyKey.key == key,
+            IdempotencyKey.expires_at > datetime.utcnow(),
+        )
+    ).first()
+    if stored is None:
+        return None
+    if stored.request_hash != fingerprint:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used for a different request",
+        )
+    return stored.response
+
+
+def claim_key(
+    db: Session, scope: str, user_id: int, key: str, fingerprint: str
+) -> bool:
+    """
+    Write the key's row, without a response, in the session's transaction,
+    so that it commits together with whatever the request changes. Returns
+    False if another request holds the key.
+
+    While that other request's claim is uncommitted the insert waits on it,
+    so duplicates are serialised on the session's own connection. DO NOTHING
+    leaves the loser without a lock on the row, which the winner updates
+    again to store its response.
+    """
+    now = datetime.utcnow()
+    # An expired row for the key is free to take.
+    db.query(IdempotencyKey).filter(
+        IdempotencyKey.scope == scope,
+        IdempotencyKey.user_id == user_id,
+        IdempotencyKey.key == key,
+        IdempotencyKey.expires_at <= now,
+    ).delete(synchronize_session=False)
+    claimed = db.execute(
+        pg_insert(IdempotencyKey)
+        .values(
+            scope=scope,
+            user_id=user_id,
+            key=key,
+            request_hash=fingerprint,
+            response=None,
+            created_at=now,
+            expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+        )
+        .on_conflict_do_nothing(index_elements=["scope", "user_id", "key"])
+        .returning(IdempotencyKey.key)
+    ).first()
+    return claimed is not None
+
+
+def save_response(db: Session, scope: str, user_id: int, key: str, response) -> None:
+    db.execute(
+        update(IdempotencyKey)
+        .where(
+            IdempotencyKey.scope == scope,
+            IdempotencyKey.user_id == user_id,
+            IdempotencyKey.key == key,
+        )
+        .values(response=response)
+    )
+    # Drop this user's expired keys while we're here; the primary key
+    # prefix keeps that cheap.
+    db.query(IdempotencyKey).filter(
+        IdempotencyKey.scope == scope,
+        IdempotencyKey.user_id == user_id,
+        IdempotencyKey.expires_at <= datetime.utcnow(),
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def _not_replayable() -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail="The request with this Idempotency-Key was processed, but its "
+        "response is not available",
+    )
+
+
+def _replay(db: Session, scope: str, user_id: int, key: str, fingerprint: str) -> dict:
+    # The request that won the claim stores its response right after its
+    # commit, which is what let our claim attempt return.
+    deadline = time.monotonic() + REPLAY_WAIT_SECONDS
+    while True:
+        stored = load_response(db, scope, user_id, key, fingerprint)
+        if stored is not None:
+            return stored
+        if time.monotonic() >= deadline:
+            raise _not_replayable()
+        time.sleep(REPLAY_POLL_SECONDS)
+
+
+def run_idempotent(
+    db: Session,
+    scope: str,
+    user_id: int,
+    key: Optional[str],
+    request: Any,
+    handler: Callable[[], Any],
+) -> Tuple[Any, bool]:
+    """
+    Run `handler` once per (scope, user, Idempotency-Key) and return
+    (response, replayed).
+
+    A retry within the TTL gets the stored response back without running
+    the handler. The key row is claimed in the session before the handler
+    runs, so the handler's own commit records it with the sale, and the
+    response is stored right after. A duplicate arriving meanwhile waits on
+    the uncommitted claim, on its session's own connection, and then polls
+    for the response, which it replays; if that never comes (the first
+    request died in between) it gets a 409. Failed handlers are rolled back
+    with their claim and store nothing, so the client can retry them.
+    """
+    if not key:
+        return handler(), False
+
+    fingerprint = request_fingerprint(request)
+    stored = load_response(db, scope, user_id, key, fingerprint)
+    if stored is not None:
+        return stored, True
+    if not claim_key(db, scope, user_id, key, fingerprint):
+        return _replay(db, scope, user_id, key, fingerprint), True
+
+    try:
+        response = jsonable_encoder(handler())
+    except BaseException:
+        db.rollback()
+        raise
+    save_response(db, scope, user_id, key, response)
+    return response, False
+
+
+async def run_idempotent_async(
+    db: AsyncSession,
+    scope: str,
+    user_id: int,
+    key: Optional[str],
+    request: Any,
+    handler: Callable[[], Awaitable[Any]],
+) -> Tuple[Any, bool]:
+    """run_idempotent for async routes; the duplicate waits without blocking."""
+    if not key:
+        return await handler(), False
+
+    fingerprint = request_fingerprint(request)
+    stored = await db.run_sync(load_response, scope, user_id, key, fingerprint)
+    if stored is not None:
+        return stored, True
+    if not await db.run_sync(claim_key, scope, user_id, key, fingerprint):
+        deadline = time.monotonic() + REPLAY_WAIT_SECONDS
+        while True:
+            stored = await db.run_sync(load_response, scope, user_id, key, fingerprint)
+            if stored is not None:
+                return stored, True
+            if time.monotonic() >= deadline:
+                raise _not_replayable()
+            await asyncio.sleep(REPLAY_POLL_SECONDS)
+
+    try:
+        response = jsonable_encoder(await handler())
+    except BaseException:
+        await db.rollback()
+        raise
+    await db.run_sync(save_response, scope, user_id, key, response)
+    return response, False
@@ -0,0 +1,235 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Union
+
+from sqlalchemy import delete, event, func, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal, async_engine
+from app.models.notification_event import (
+    NotificationEvent,
+    NotificationOutbox,
+    live_events_seq,
+)
+from app.logger import Logger
+
+logger = Logger.get_logger(__name__)
+
+# Advisory lock serializing event inserts. With it, events commit in seq
+# order, so a poller that has seen seq N can never later miss an N-1 that
+# was still in flight.
+_RECORD_LOCK = 0x6C697665  # "live"
+# Old events are purged on every PURGE_EVERY-th insert.
+PURGE_EVERY = 500
+
+
+# Session.info keys: notifications waiting for the session's commit, and
+# whether the commit under way wrote any to the outbox.
+_PENDING = "pending_notifications"
+_WRITTEN = "outbox_written"
+# Called (from any thread) after a commit that wrote outbox rows.
+_outbox_listeners: List[Callable[[], None]] = []
+
+
+async def _insert_events(conn: AsyncConnection, events: list) -> List[int]:
+    """Number and store (topics, payload) pairs; must run in a transaction."""
+    await conn.execute(select(func.pg_advisory_xact_lock(_RECORD_LOCK)))
+    seqs = (
+        await conn.scalars(
+            select(live_events_seq.next_value()).select_from(
+                func.generate_series(1, len(events))
+            )
+        )
+    ).all()
+    now = datetime.utcnow()
+    await conn.execute(
+        insert(NotificationEvent),
+        [
+            {"seq": seq, "topics": topics, "payload": payload, "created_at": now}
+            for seq, (topics, payload) in zip(seqs, events)
+        ],
+    )
+    if any(seq % PURGE_EVERY == 0 for seq in seqs):
+        cutoff = now - timedelta(hours=settings.LIVE_EVENTS_RETENTION_HOURS)
+        await conn.execute(
+            delete(NotificationEvent).where(NotificationEvent.created_at < cutoff)
+        )
+    return seqs
+
+
+async def record_event(topics: Optional[List[str]], payload: dict) -> int:
+    """Store a live event and return the seq it was given."""
+    async with async_engine.begin() as conn:
+        (seq,) = await _insert_events(conn, [(topics, payload)])
+    return seq
+
+
+def queue_notification(
+    db: Union[Session, AsyncSession],
+    topics: List[str],
+    payload: Union[dict, Callable[[Session], dict]],
+    coalesce_key: Optional[str] = None,
+) -> None:
+    """
+    Send a live notification once `db` commits, atomically with the change:
+    the notification is written to the outbox in the same transaction, and
+    dropped if the session rolls back instead.
+
+    `payload` may be a callable, given the (sync) session just before the
+    commit, when it depends on what the transaction did. Notifications
+    queued with the same `coalesce_key` close together are delivered as one.
+    """
+    session = getattr(db, "sync_session", db)
+    if not session.in_transaction():
+        # So that a rollback before any query still discards it.
+        session.begin()
+    session.info.setdefault(_PENDING, []).append((topics, payload, coalesce_key))
+
+
+@event.listens_for(Session, "before_commit")
+def _write_outbox(session: Session) -> None:
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+    session.add_all(
+        NotificationOutbox(
+            topics=topics,
+            payload=payload(session) if callable(payload) else payload,
+            coalesce_key=coalesce_key,
+        )
+        for topics, payload, coalesce_key in pending
+    )
+    session.info[_WRITTEN] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _outbox_committed(session: Session) -> None:
+    if session.info.pop(_WRITTEN, False):
+        for listener in _outbox_listeners:
+            listener()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session: Session, previous_transaction) -> None:
+    if previous_transaction.nested:
+        return
+    session.info.pop(_PENDING, None)
+    session.info.pop(_WRITTEN, None)
+
+
+def on_outbox_commit(listener: Callable[[], None]) -> None:
+    _outbox_listeners.append(listener)
+
+
+def _coalesce(rows: list) -> list:
+    """(topics, payload) per row, with rows sharing a coalesce_key merged."""
+    events, by_key = [], {}
+    for row in rows:
+        if row.coalesce_key is None:
+            events.append([row.topics, row.payload, 1])
+            continue
+        merged = by_key.get(row.coalesce_key)
+        if merged is None:
+            merged = by_key[row.coalesce_key] = [row.topics, row.payload, 1]
+            events.append(merged)
+            continue
+        # The latest payload wins; topics add up (None meaning everyone).
+        if merged[0] is not None:
+            merged[0] = (
+                None if row.topics is None else sorted({*merged[0], *row.topics})
+            )
+        merged[1] = row.payload
+        merged[2] += 1
+    return [
+        (topics, payload if count == 1 else {**payload, "coalesced": count})
+        for topics, payload, count in events
+    ]
+
+
+async def drain_outbox(limit: int) -> tuple[int, List[dict]]:
+    """
+    Move up to `limit` committed outbox rows into notification_events.
+    Returns how many rows were taken and the resulting backplane envelopes.
+    Rows are claimed with SKIP LOCKED, so dispatchers on several workers
+    share the work without blocking.
+    """
+    async with async_engine.begin() as conn:
+        claimed = (
+            select(NotificationOutbox.id)
+            .order_by(NotificationOutbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        rows = (
+            await conn.execute(
+                delete(NotificationOutbox)
+                .where(NotificationOutbox.id.in_(claimed))
+                .returning(
+                    NotificationOutbox.id,
+                    NotificationOutbox.topics,
+                    NotificationOutbox.payload,
+                    NotificationOutbox.coalesce_key,
+                )
+            )
+        ).all()
+        if not rows:
+            return 0, []
+        events = _coalesce(sorted(rows, key=lambda row: row.id))
+        seqs = await _insert_events(conn, events)
+    return len(rows), [
+        {"topics": topics, "seq": seq, "payload": payload}
+        for seq, (topics, payload) in zip(seqs, events)
+    ]
+
+
+async def latest_seq(db: AsyncSession) -> int:
+    return await db.scalar(select(func.coalesce(func.max(NotificationEvent.seq), 0)))
+
+
+async def fetch_events(
+    db: AsyncSession, topics: List[str], since: int, limit: int
+) -> tuple[list, bool]:
+    """
+    Events after `since` on any of `topics` (broadcasts included), oldest
+    first, and whether events after `since` may already have been purged.
+    """
+    oldest = await db.scalar(select(func.min(NotificationEvent.seq)))
+    if oldest is not None and since + 1 < oldest:
+        return [], True
+    events = (
+        await db.scalars(
+            select(NotificationEvent)
+            .where(
+                NotificationEvent.seq > since,
+                or_(
+                    NotificationEvent.topics.is_(None),
+                    NotificationEvent.topics.overlap(topics),
+                ),
+            )
+            .order_by(NotificationEvent.seq)
+            .limit(limit)
+        )
+    ).all()
+    return events, False
+
+
+async def wait_for_events(
+    topics: List[str], since: int, wait: float, limit: int
+) -> tuple[list, bool]:
+    """
+    fetch_events, but if nothing is new keep checking every
+    LIVE_POLL_INTERVAL_SECONDS for up to `wait` seconds. Each check uses a
+    fresh session so no connection is held while waiting.
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        async with AsyncSessionLocal() as db:
+            events, resync = await fetch_events(db, topics, since, limit)
+        remaining = deadline - time.monotonic()
+        if events or resync or remaining <= 0:
+            return events, resync
+        await asyncio.sleep(min(settings.LIVE_POLL_INTERVAL_SECONDS, remaining))
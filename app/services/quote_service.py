@@ -0,0 +1,143 @@
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.currency import Currency
+from app.models.currency_lot import CurrencyLot
+from app.services.cost_engine import lot_cost, sale_total
+
+# Session.info key: currencies whose lots the session changed, invalidated
+# once it commits.
+_CHANGED = "changed_cost_curves"
+
+
+class CostCurve:
+    """
+    Cost of taking any amount from a currency's open lots in FIFO order.
+
+    Holds the open lots' cumulative quantities and, per operation, their
+    cumulative costs, so pricing an amount is a bisect into the quantities
+    plus a linear step inside the lot it ends in. Past the open stock the
+    rest is priced at the newest lot's unit cost, as allocate_currency_lots
+    charges it. Read-only once built; shared between threads.
+    """
+
+    def __init__(self, lots: List[Tuple[float, float]], newest_cost: Optional[float]):
+        self.lots = lots
+        self.newest_cost = newest_cost
+        self.quantities = [0.0, *accumulate(qty for qty, _ in lots)]
+        self._costs: Dict[str, List[float]] = {}
+
+    @property
+    def available(self) -> float:
+        return self.quantities[-1]
+
+    def _prefix(self, operation: str) -> List[float]:
+        costs = self._costs.get(operation)
+        if costs is None:
+            costs = [
+                0.0,
+                *accumulate(lot_cost(operation, qty, unit) for qty, unit in self.lots),
+            ]
+            self._costs[operation] = costs
+        return costs
+
+    def cost(self, amount: float, operation: str) -> float:
+        costs = self._prefix(operation)
+        if self.lots and amount <= self.available:
+            # quantities[i - 1] < amount <= quantities[i]: ends in lot i - 1
+            i = bisect_left(self.quantities, amount, 1, len(self.lots))
+            partial = amount - self.quantities[i - 1]
+            return costs[i - 1] + lot_cost(operation, partial, self.lots[i - 1][1])
+        if self.newest_cost is None:
+            raise ValueError("No currency lots exist to allocate from")
+        shortfall = amount - self.available
+        return costs[-1] + lot_cost(operation, shortfall, self.newest_cost)
+
+
+cost_curves = TTLCache(ttl=settings.QUOTE_CURVE_TTL_SECONDS, maxsize=256)
+
+
+def _load_curve(db: Session, currency_id: int) -> Optional[CostCurve]:
+    if db.get(Currency, currency_id) is None:
+        return None
+    lots = db.execute(
+        select(CurrencyLot.remaining_quantity, CurrencyLot.cost_per_unit)
+        .where(
+            CurrencyLot.currency_id == currency_id,
+            CurrencyLot.remaining_quantity > 0,
+        )
+        .order_by(CurrencyLot.created_at, CurrencyLot.id)
+    ).all()
+    newest_cost = db.scalar(
+        select(CurrencyLot.cost_per_unit)
+        .where(CurrencyLot.currency_id == currency_id)
+        .order_by(CurrencyLot.created_at.desc(), CurrencyLot.id.desc())
+        .limit(1)
+    )
+    return CostCurve([tuple(lot) for lot in lots], newest_cost)
+
+
+def get_cost_curve(db: Session, currency_id: int) -> Optional[CostCurve]:
+    """The currency's cost curve, or None if there is no such currency."""
+    return cost_curves.get_or_load(currency_id, lambda: _load_curve(db, currency_id))
+
+
+def quote(
+    curve: CostCurve, amount: float, sale_rate: Optional[float], operation: str
+) -> Dict:
+    """
+    What selling `amount` units would cost and earn right now, in the shape
+    of compute_cost_report without the per-lot breakdown. Nothing is
+    allocated; total_sale and profit are None when no sale rate is given.
+    """
+    total_cost = curve.cost(amount, operation)
+    total_sale = profit = None
+    if sale_rate is not None:
+        total_sale = sale_total(amount, sale_rate, operation)
+        profit = total_sale - total_cost
+        if operation != "pluse":
+            profit = round(profit, 2)
+    return {
+        "amount": amount,
+        "available": curve.available,
+        "shortfall": max(amount - curve.available, 0.0),
+        "total_cost": round(total_cost, 2),
+        "avg_cost": round(total_cost / amount, 4) if amount else 0.0,
+        "total_sale": total_sale,
+        "profit": profit,
+    }
+
+
+def mark_lots_changed(session: Session, currency_id: int) -> None:
+    """
+    Drop the currency's cached curve once `session` commits. Changes made
+    through the ORM are picked up on flush; statements that update lots
+    directly have to call this.
+    """
+    session.info.setdefault(_CHANGED, set()).add(currency_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_lots(session: Session, flush_context) -> None:
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, CurrencyLot):
+            mark_lots_changed(session, obj.currency_id)
+        elif isinstance(obj, Currency) and obj.id is not None:
+            mark_lots_changed(session, obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_curves(session: Session) -> None:
+    for currency_id in session.info.pop(_CHANGED, ()):
+        cost_curves.invalidate(currency_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_changed_curves(session: Session, previous_transaction) -> None:
+    if previous_transaction.nested:
+        return
+    session.info.pop(_CHANGED, None)
@@ -1,24 +1,25 @@
 from sqlalchemy.orm import Session
 from app.models.receipt import ReceiptOrder
-from app.models.customers import Customer
 from app.models.users import User
-from app.services.treasury_service import modify_employee_balance
+from app.services.balance_service import (
+    adjust_customer_balance,
+    adjust_treasury_balance,
+)
 
 
 def create_receipt(
     db: Session, employee: User, customer_id: int, amount: float
 ) -> ReceiptOrder:
-    customer = db.query(Customer).filter(Customer.id == customer_id).first()
-    if not customer:
+    # Treasury before customer, the lock order used by every balance change
+    adjust_treasury_balance(db, employee.id, amount)
+    if adjust_customer_balance(db, customer_id, -amount) is None:
+        db.rollback()
         raise ValueError("Customer not found")
 
     receipt = ReceiptOrder(
         amount=amount, employee_id=employee.id, customer_id=customer_id
     )
 
-    customer.balance_due -= amount
-    modify_employee_balance(db, employee.id, amount)
-
     db.add(receipt)
     db.commit()
     db.refresh(receipt)
@@ -5,12 +5,21 @@ from app.models.transactions import Transaction
 from app.models.receipt import ReceiptOrder
 from app.models.transfer import TreasuryTransfer
 from decimal import Decimal, ROUND_HALF_UP
-from app.models import Service
+from datetime import timedelta
+from sqlalchemy import case, func, select, tuple_
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models import (
+    Country,
+    DailyTransactionRollup,
+    Service,
+    TransactionCurrencyLot,
+    User,
+)
 
 to_import = ["Session"]
-from sqlalchemy.orm import joinedload, Session
+from sqlalchemy.orm import Session
 from app.models.transactions import Transaction, TransactionStatus
-from app.services.allocate_currency import allocate_and_compute
 from app.logger import Logger
 
 
@@ -63,21 +72,6 @@ def quantize(v: Decimal) -> Decimal:
     return v.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
 
 
-def compute_expected_lyd(amount_foreign: Decimal, service) -> Decimal:
-    price = Decimal(str(service.price))
-    op = service.operation
-    if op == "multiply":
-        return quantize(amount_foreign * price)
-    elif op == "divide":
-        if price == 0:
-            raise ValueError("Division by zero in rate")
-        return quantize(amount_foreign / price)
-    elif op == "plus":  # head-to-head
-        return quantize(amount_foreign)
-    else:
-        raise ValueError(f"Unsupported operation {op}")
-
-
 def get_financial_report(
     db: Session,
     start_date: date,
@@ -95,128 +89,195 @@ def get_financial_report(
         country,
     )
 
-    start_dt = datetime.combine(start_date, time.min)
-    end_dt = datetime.combine(end_date, time.max)
-
-    # Build filters
-    filters = [
-        Transaction.created_at >= start_dt,
-        Transaction.created_at <= end_dt,
-        Transaction.status == TransactionStatus.completed,
-    ]
+    # Completed sales pre-aggregated per day; a long range reads a few
+    # rollup rows per day instead of every transaction. Profit and cost are
+    # those booked on each sale when it was made.
+    R = DailyTransactionRollup
+    query = db.query(
+        R.day,
+        func.sum(R.txn_count).label("txns"),
+        func.sum(R.amount_foreign).label("sent"),
+        func.sum(R.amount_lyd).label("lyd"),
+        func.sum(R.profit).label("profit"),
+        func.sum(R.cost).label("cost"),
+    ).filter(
+        R.day >= start_date,
+        R.day <= end_date,
+        R.status == TransactionStatus.completed,
+    )
     if employee_id:
-        filters.append(Transaction.employee_id == employee_id)
+        query = query.filter(R.employee_id == employee_id)
+    if service_name or country:
+        query = query.join(Service, Service.id == R.service_id)
     if service_name:
-        filters.append(Transaction.service.has(name=service_name))
+        query = query.filter(Service.name == service_name)
     if country:
-        filters.append(Transaction.service.has(Service.country.has(name=country)))
+        query = query.join(Country, Country.id == Service.country_id).filter(
+            Country.name == country
+        )
+    daily_rows = query.group_by(R.day).order_by(R.day).all()
+    logger.info("Read %d days of completed transaction rollups", len(daily_rows))
 
-    # Eager-load
-    transactions = (
-        db.query(Transaction)
-        .options(joinedload(Transaction.service))
-        .filter(*filters)
-        .all()
-    )
-    logger.info("Fetched %d completed transactions", len(transactions))
+    def dec(v) -> Decimal:
+        return Decimal(str(v or 0))
 
+    total_transactions = 0
     total_sent = Decimal("0")
     total_lyd = Decimal("0")
-    total_cost_from_lots = Decimal("0")
-    total_profit_computed = Decimal("0")
-    total_profit_stored = Decimal("0")
-
-    daily_aggregate: dict = {}
-
-    for t in transactions:
-        amt_foreign = Decimal(str(t.amount_foreign or 0))
-        lyd_collected = Decimal(str(t.amount_lyd or 0))
-        stored_profit = Decimal(str(t.profit or 0))
-
-        op = t.service.operation
-        if op in ("multiply", "divide"):
-            sale_rate = float(t.service.price)
-        elif op == "pluse":
-            sale_rate = 1.0
-        else:
-            logger.error("Unsupported operation %s on txn %s", op, t.id)
-            continue
-
-        alloc = allocate_and_compute(
-            db=db,
-            currency=t.service.currency,
-            needed_amount=float(amt_foreign),
-            sale_rate=sale_rate,
-            operation=op,
-        )
-        cost_from_lots = quantize(Decimal(str(alloc["total_cost"])))
-        profit_computed = quantize(Decimal(str(alloc["profit"])))
-
-        try:
-            expected = compute_expected_lyd(amt_foreign, t.service)
-            if abs(expected - lyd_collected) > Decimal("0.5"):
-                logger.warning(
-                    "Txn #%s LYD mismatch: expected %s vs stored %s",
-                    t.id,
-                    expected,
-                    lyd_collected,
-                )
-        except Exception:
-            logger.debug("Skipping LYD check for txn #%s", t.id)
-
-        implied = quantize(lyd_collected - stored_profit)
-        if abs(implied - cost_from_lots) > Decimal("0.5"):
-            logger.warning(
-                "Txn #%s cost drift: implied %s vs allocated %s",
-                t.id,
-                implied,
-                cost_from_lots,
-            )
+    total_profit = Decimal("0")
+    total_cost = Decimal("0")
+    daily_breakdown = []
 
-        total_sent += amt_foreign
-        total_lyd += lyd_collected
-        total_cost_from_lots += cost_from_lots
-        total_profit_computed += profit_computed
-        total_profit_stored += stored_profit
-
-        day = t.created_at.date()
-        if day not in daily_aggregate:
-            daily_aggregate[day] = {
-                "total_lyd": Decimal("0"),
-                "total_profit": Decimal("0"),
-            }
-        daily_aggregate[day]["total_lyd"] += lyd_collected
-        daily_aggregate[day]["total_profit"] += profit_computed
-
-    total_cost = quantize(total_lyd - total_profit_computed)
-    if abs(total_cost - total_cost_from_lots) > Decimal("1.0"):
-        logger.warning(
-            "Aggregate cost divergence: computed %s vs lots-based %s",
-            total_cost,
-            total_cost_from_lots,
-        )
+    for row in daily_rows:
+        total_transactions += row.txns
+        total_sent += dec(row.sent)
+        total_lyd += dec(row.lyd)
+        total_profit += dec(row.profit)
+        total_cost += dec(row.cost)
 
-    daily_breakdown = []
-    for day in sorted(daily_aggregate):
-        lyd = quantize(daily_aggregate[day]["total_lyd"])
-        profit = quantize(daily_aggregate[day]["total_profit"])
-        cost = quantize(lyd - profit)
+        lyd = quantize(dec(row.lyd))
+        profit = quantize(dec(row.profit))
+        cost = quantize(dec(row.cost))
         daily_breakdown.append(
             {
-                "date": str(day),
+                "date": str(row.day),
                 "total_lyd": float(lyd),
                 "total_profit": float(profit),
                 "total_cost": float(cost),
             }
         )
-        logger.debug("Daily %s -> lyd %s, profit %s, cost %s", day, lyd, profit, cost)
+        logger.debug(
+            "Daily %s -> lyd %s, profit %s, cost %s", row.day, lyd, profit, cost
+        )
 
     return {
-        "total_transactions": len(transactions),
+        "total_transactions": total_transactions,
         "total_sent_value": float(quantize(total_sent)),
         "total_lyd_collected": float(quantize(total_lyd)),
-        "total_cost": float(total_cost),
-        "total_profit": float(quantize(total_profit_computed)),
-        "total_profit_stored": float(quantize(total_profit_stored)),
+        "total_cost": float(quantize(total_cost)),
+        "total_profit": float(quantize(total_profit)),
         "daily_breakdown": daily_breakdown,
     }
+
+
+# Overview polled by many admin dashboards; transaction writes clear it.
+overview_cache = TTLCache(ttl=settings.OVERVIEW_CACHE_TTL_SECONDS, maxsize=8)
+
+OVERVIEW_TOP_N = 5
+
+# grouping(employee_id, service_id, currency_id) for each grouping set
+_BY_EMPLOYEE, _BY_SERVICE, _BY_CURRENCY = 0b011, 0b101, 0b110
+
+
+def get_admin_overview(db: Session) -> dict:
+    """Today's totals and the top-N lists, cached for a few seconds."""
+    return overview_cache.get_or_load("overview", lambda: _compute_overview(db))
+
+
+def _compute_overview(db: Session) -> dict:
+    today = date.today()
+    start = datetime.combine(today, datetime.min.time())
+    end = datetime.combine(today, datetime.max.time())
+
+    # 1) Today's totals in one aggregate; profit is LYD minus the cost of the
+    #    lots each sale consumed, summed per transaction before the join.
+    lot_cost = (
+        select(
+            TransactionCurrencyLot.transaction_id,
+            func.sum(
+                TransactionCurrencyLot.quantity * TransactionCurrencyLot.cost_per_unit
+            ).label("cost"),
+        )
+        .group_by(TransactionCurrencyLot.transaction_id)
+        .subquery()
+    )
+    today_row = (
+        db.query(
+            func.count(Transaction.id).label("txns"),
+            func.coalesce(func.sum(Transaction.amount_lyd), 0).label("lyd"),
+            func.coalesce(func.sum(Transaction.amount_foreign), 0).label("foreign"),
+            func.coalesce(
+                func.sum(Transaction.amount_lyd - func.coalesce(lot_cost.c.cost, 0)),
+                0,
+            ).label("profit"),
+        )
+        .outerjoin(lot_cost, lot_cost.c.transaction_id == Transaction.id)
+        .filter(Transaction.created_at.between(start, end))
+        .one()
+    )
+
+    # 2) Top employees / services / currencies over the recent window, read
+    #    from the daily rollups with one grouping-sets query ranked per set.
+    R = DailyTransactionRollup
+    grouping = func.grouping(R.employee_id, R.service_id, R.currency_id)
+    txns = func.sum(R.txn_count)
+    lyd = func.sum(R.amount_lyd)
+    used = func.sum(R.amount_foreign)
+    # service_id / currency_id 0 are the "none" buckets; rank them last
+    none_bucket = case(
+        ((grouping == _BY_SERVICE) & (R.service_id == 0), 1),
+        ((grouping == _BY_CURRENCY) & (R.currency_id == 0), 1),
+        else_=0,
+    )
+    ranked = (
+        select(
+            R.employee_id,
+            R.service_id,
+            R.currency_id,
+            grouping.label("grouping"),
+            none_bucket.label("none_bucket"),
+            txns.label("txns"),
+            lyd.label("lyd"),
+            used.label("used"),
+            func.row_number()
+            .over(
+                partition_by=grouping,
+                order_by=[
+                    none_bucket,
+                    case(
+                        (grouping == _BY_EMPLOYEE, lyd),
+                        (grouping == _BY_SERVICE, txns),
+                        else_=used,
+                    ).desc(),
+                ],
+            )
+            .label("rank"),
+        )
+        .where(R.day >= today - timedelta(days=settings.OVERVIEW_TOP_WINDOW_DAYS))
+        .group_by(
+            func.grouping_sets(
+                tuple_(R.employee_id), tuple_(R.service_id), tuple_(R.currency_id)
+            )
+        )
+        .subquery()
+    )
+    top_rows = db.execute(
+        select(ranked, User.username, Service.name.label("service_name"))
+        .outerjoin(User, User.id == ranked.c.employee_id)
+        .outerjoin(Service, Service.id == ranked.c.service_id)
+        .where(ranked.c.rank <= OVERVIEW_TOP_N, ranked.c.none_bucket == 0)
+        .order_by(ranked.c.grouping, ranked.c.rank)
+    ).all()
+
+    top_employees, top_services, top_currencies = [], [], []
+    for row in top_rows:
+        if row.grouping == _BY_EMPLOYEE:
+            top_employees.append({"username": row.username, "total": float(row.lyd)})
+        elif row.grouping == _BY_SERVICE:
+            top_services.append(
+                {"service_name": row.service_name, "count": int(row.txns)}
+            )
+        elif row.grouping == _BY_CURRENCY:
+            top_currencies.append(
+                {"currency_id": row.currency_id, "used": float(row.used)}
+            )
+
+    return {
+        "total_txns_today": int(today_row.txns),
+        "total_lyd_today": float(today_row.lyd),
+        "total_foreign_today": float(today_row.foreign),
+        "profit_today": float(today_row.profit),
+        "top_employees": top_employees,
+        "top_services": top_services,
+        "top_currencies": top_currencies,
+    }
@@ -0,0 +1,191 @@
+from collections import defaultdict
+from datetime import date
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+from sqlalchemy import Date, cast, func, insert, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from app.models.daily_transaction_rollup import DailyTransactionRollup
+from app.models.transactions import Transaction
+from app.logger import Logger
+
+logger = Logger.get_logger(__name__)
+
+# (day, employee_id, service_id, currency_id, status)
+RollupKey = Tuple[date, int, int, int, str]
+RollupEntry = Tuple[RollupKey, Dict[str, float]]
+
+MEASURES = ("txn_count", "amount_foreign", "amount_lyd", "profit", "cost")
+# Transaction columns a rollup entry is computed from.
+ENTRY_COLUMNS = (
+    "created_at",
+    "employee_id",
+    "service_id",
+    "currency_id",
+    "status",
+    "amount_foreign",
+    "amount_lyd",
+    "profit",
+)
+
+
+def rollup_entry(txn: Transaction) -> Optional[RollupEntry]:
+    """
+    What a transaction contributes to daily_transaction_rollups right now.
+
+    Cost is the implied cost (LYD collected minus stored profit), which is the
+    FIFO lot cost booked when the sale was made.
+    """
+    return row_rollup_entry({column: getattr(txn, column) for column in ENTRY_COLUMNS})
+
+
+def row_rollup_entry(row: Mapping[str, Any]) -> Optional[RollupEntry]:
+    """
+    rollup_entry for a transaction given as its column values, e.g. a bulk
+    insert row, without building a Transaction instance for it.
+    """
+    if row["created_at"] is None:
+        return None
+    status = getattr(row["status"], "value", row["status"])
+    key = (
+        row["created_at"].date(),
+        row["employee_id"],
+        row["service_id"] or 0,
+        row["currency_id"] or 0,
+        status,
+    )
+    amount_lyd = row["amount_lyd"] or 0.0
+    profit = row["profit"] or 0.0
+    return key, {
+        "txn_count": 1,
+        "amount_foreign": row["amount_foreign"] or 0.0,
+        "amount_lyd": amount_lyd,
+        "profit": profit,
+        "cost": amount_lyd - profit,
+    }
+
+
+def apply_rollup_deltas(db: Session, deltas: Dict[RollupKey, Dict[str, float]]):
+    """Add the given per-key deltas to the rollups with a single upsert."""
+    rows = []
+    for (day, employee_id, service_id, currency_id, status), values in deltas.items():
+        if not any(values.get(m) for m in MEASURES):
+            continue
+        rows.append(
+            {
+                "day": day,
+                "employee_id": employee_id,
+                "service_id": service_id,
+                "currency_id": currency_id,
+                "status": status,
+                **{m: values.get(m, 0) for m in MEASURES},
+            }
+        )
+    if not rows:
+        return
+
+    stmt = pg_insert(DailyTransactionRollup).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["day", "employee_id", "service_id", "currency_id", "status"],
+        set_={
+            m: getattr(DailyTransactionRollup, m) + getattr(stmt.excluded, m)
+            for m in MEASURES
+        },
+    )
+    db.execute(stmt)
+
+
+def sync_transaction_rollup(
+    db: Session,
+    after: Iterable[Optional[RollupEntry]] = (),
+    before: Iterable[Optional[RollupEntry]] = (),
+) -> None:
+    """
+    Move transactions' contributions from their `before` entries to their
+    `after` entries. Call it before the commit of the change so the rollups
+    are updated in the same DB transaction.
+    """
+    deltas: Dict[RollupKey, Dict[str, float]] = defaultdict(
+        lambda: dict.fromkeys(MEASURES, 0)
+    )
+    for sign, entries in ((-1, before), (1, after)):
+        for entry in entries:
+            if entry is None:
+                continue
+            key, values = entry
+            for m in MEASURES:
+                deltas[key][m] += sign * values[m]
+    apply_rollup_deltas(db, deltas)
+
+
+def rebuild_daily_rollups(
+    db: Session, start: Optional[date] = None, end: Optional[date] = None
+) -> int:
+    """
+    Recompute rollups from `transactions` for [start, end] (all days when
+    omitted). The rollup table is locked for the rebuild so that concurrent
+    writers apply their deltas on top of the rebuilt rows.
+    """
+    day = cast(Transaction.created_at, Date)
+    rollup_day_filters = []
+    txn_filters = [Transaction.created_at.isnot(None), Transaction.status.isnot(None)]
+    if start:
+        rollup_day_filters.append(DailyTransactionRollup.day >= start)
+        txn_filters.append(day >= start)
+    if end:
+        rollup_day_filters.append(DailyTransactionRollup.day <= end)
+        txn_filters.append(day <= end)
+
+    db.execute(text("LOCK TABLE daily_transaction_rollups IN EXCLUSIVE MODE"))
+    db.query(DailyTransactionRollup).filter(*rollup_day_filters).delete(
+        synchronize_session=False
+    )
+    source = (
+        select(
+            day,
+            Transaction.employee_id,
+            func.coalesce(Transaction.service_id, 0),
+            func.coalesce(Transaction.currency_id, 0),
+            Transaction.status,
+            func.count(),
+            func.coalesce(func.sum(Transaction.amount_foreign), 0),
+            func.coalesce(func.sum(Transaction.amount_lyd), 0),
+            func.coalesce(func.sum(Transaction.profit), 0),
+            func.coalesce(func.sum(Transaction.amount_lyd - Transaction.profit), 0),
+        )
+        .where(*txn_filters)
+        .group_by(
+            day,
+            Transaction.employee_id,
+            Transaction.service_id,
+            Transaction.currency_id,
+            Transaction.status,
+        )
+    )
+    result = db.execute(
+        insert(DailyTransactionRollup).from_select(
+            ["day", "employee_id", "service_id", "currency_id", "status", *MEASURES],
+            source,
+        )
+    )
+    db.commit()
+    logger.info("Rebuilt %s daily rollup rows (%s..%s)", result.rowcount, start, end)
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    import argparse
+    from app.db.session import SessionLocal
+
+    parser = argparse.ArgumentParser(
+        description="Rebuild daily_transaction_rollups from transaction history."
+    )
+    parser.add_argument("--start", type=date.fromisoformat, help="YYYY-MM-DD")
+    parser.add_argument("--end", type=date.fromisoformat, help="YYYY-MM-DD")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        rows = rebuild_daily_rollups(db, args.start, args.end)
+        print("Rebuilt %d rollup rows." % rows)
+    finally:
+        db.close()
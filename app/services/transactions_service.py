@@ -1,18 +1,39 @@
-import random
-from sqlalchemy.orm import Session
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Tuple
+from sqlalchemy import String, cast, func, insert, literal, select
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.sql.elements import ColumnElement
 from fastapi import HTTPException
 
-from app.models.transactions import Transaction, PaymentType, TransactionStatus
+from app.models.transactions import (
+    Transaction,
+    PaymentType,
+    TransactionStatus,
+    transaction_reference_seq,
+)
 from app.schemas.transactions import TransactionCreate, TransactionUpdate
-from app.models.customers import Customer
 from app.models.currency import Currency
 from app.models.service import Service
 from app.models.users import User
 from app.models.currency_lot import CurrencyLot
 from app.services.treasury_service import adjust_employee_balance
+from app.services.balance_service import adjust_customer_balance
 from app.models.trnsx_status_log import TransactionStatusLog
-from app.services.allocate_currency import allocate_and_compute
+from app.models.customers import Customer
+from app.services.allocate_currency import (
+    allocate_and_compute,
+    allocate_currency_lots,
+    split_allocations,
+)
+from app.services.cost_engine import compute_cost_report
 from app.models.transaction_currency_lot import TransactionCurrencyLot
+from app.services.rollup_service import (
+    rollup_entry,
+    row_rollup_entry,
+    sync_transaction_rollup,
+)
+from app.services.report_service import overview_cache
 from app.logger import Logger
 from itertools import count
 
@@ -36,10 +57,42 @@ def compute_amount_lyd(
         raise ValueError(f"unsupported operation {operation}")
 
 
-def generate_employee_reference(db: Session, employee: User) -> str:
-    initials = f"{employee.full_name[0]}{employee.username[0]}".upper()
-    random_digits = random.randint(100, 999)
-    return f"{initials}{random_digits}"
+def service_sale_rate(service: Service) -> float:
+    if service.operation in ("multiply", "pluse"):
+        return service.price if service.operation == "multiply" else 1.0
+    elif service.operation == "divide":
+        if service.price == 0:
+            raise HTTPException(status_code=400, detail="Division by zero in rate")
+        return service.price
+    raise HTTPException(
+        status_code=400, detail=f"Unsupported operation {service.operation}"
+    )
+
+
+def _employee_initials(employee: User) -> str:
+    return f"{employee.full_name[0]}{employee.username[0]}".upper()
+
+
+def generate_employee_reference(employee: User) -> ColumnElement:
+    """
+    Initials followed by the next value of transaction_reference_seq, e.g.
+    "AM100042". Returned as a SQL expression so the number is drawn inside
+    the INSERT itself: unique without retries and without an extra query.
+    """
+    return literal(_employee_initials(employee)) + cast(
+        transaction_reference_seq.next_value(), String
+    )
+
+
+def generate_employee_references(db: Session, employee: User, n: int) -> List[str]:
+    """`n` references drawn from transaction_reference_seq in one query."""
+    numbers = db.scalars(
+        select(transaction_reference_seq.next_value()).select_from(
+            func.generate_series(1, n)
+        )
+    ).all()
+    initials = _employee_initials(employee)
+    return [f"{initials}{number}" for number in numbers]
 
 
 def create_transaction(
@@ -61,17 +114,7 @@ def create_transaction(
     if not currency:
         raise HTTPException(status_code=404, detail="Currency not found or inactive")
 
-    if service.operation in ("multiply", "pluse"):
-        sale_rate = service.price if service.operation == "multiply" else 1.0
-    elif service.operation == "divide":
-        sale_rate = service.price
-        if sale_rate == 0:
-            raise HTTPException(status_code=400, detail="Division by zero in rate")
-
-    else:
-        raise HTTPException(
-            status_code=400, detail=f"Unsupported operation {service.operation}"
-        )
+    sale_rate = service_sale_rate(service)
 
     report = allocate_and_compute(
         db=db,
@@ -94,7 +137,7 @@ def create_transaction(
             service.price,
         )
 
-    reference = generate_employee_reference(db, employee)
+    reference = generate_employee_reference(employee)
     txn = Transaction(
         reference=reference,
         currency_id=currency.id,
@@ -127,17 +170,188 @@ def create_transaction(
     if data.payment_type == PaymentType.cash:
         adjust_employee_balance(db, employee.id, report["total_sale"])
     elif data.customer_id:
-        customer = db.query(Customer).filter(Customer.id == data.customer_id).first()
-        if not customer:
+        if adjust_customer_balance(db, data.customer_id, report["total_sale"]) is None:
             raise HTTPException(status_code=404, detail="Customer not found")
-        customer.balance_due += report["total_sale"]
-        db.add(customer)
 
+    sync_transaction_rollup(db, after=[rollup_entry(txn)])
     db.commit()
+    overview_cache.clear()
     db.refresh(txn)
     return txn
 
 
+def create_transactions_bulk(
+    db: Session, items: List[TransactionCreate], employee: User
+) -> Tuple[List[Transaction], List[dict]]:
+    """
+    Create a batch of sales in one unit of work.
+
+    Services, currencies and customers are looked up once for the whole
+    batch. Each currency is allocated in a single FIFO pass, and the lots
+    are shared out between its sales in batch order. Rows are bulk
+    inserted, balances get one delta per employee/customer, and the batch
+    is committed once. Invalid items are skipped and reported as
+    {"index", "detail"}; the rest are created.
+    """
+    service_ids = {item.service_id for item in items}
+    services = {
+        s.id: s
+        for s in db.query(Service).filter(
+            Service.id.in_(service_ids), Service.is_active == True
+        )
+    }
+    currencies = {
+        c.id: c
+        for c in db.query(Currency).filter(
+            Currency.id.in_({s.currency_id for s in services.values()}),
+            Currency.is_active == True,
+        )
+    }
+    customer_ids = {item.customer_id for item in items if item.customer_id}
+    known_customers = set(
+        db.scalars(select(Customer.id).where(Customer.id.in_(customer_ids)))
+    )
+
+    errors = []
+    by_currency: Dict[int, list] = defaultdict(list)
+    for index, item in enumerate(items):
+        service = services.get(item.service_id)
+        if item.amount_foreign <= 0:
+            detail = "amount_foreign must be positive"
+        elif not service:
+            detail = "Service not found or inactive"
+        elif service.currency_id not in currencies:
+            detail = "Currency not found or inactive"
+        elif (
+            item.payment_type != PaymentType.cash
+            and item.customer_id
+            and item.customer_id not in known_customers
+        ):
+            detail = "Customer not found"
+        else:
+            try:
+                sale_rate = service_sale_rate(service)
+            except HTTPException as e:
+                detail = e.detail
+            else:
+                by_currency[service.currency_id].append(
+                    (index, item, service, sale_rate)
+                )
+                continue
+        errors.append({"index": index, "detail": detail})
+
+    # One allocation per currency, in currency id order so that concurrent
+    # batches take lot locks in the same order.
+    rows = []
+    lot_slices = []
+    for currency_id in sorted(by_currency):
+        sales = by_currency[currency_id]
+        try:
+            allocations = allocate_currency_lots(
+                db,
+                currencies[currency_id],
+                sum(item.amount_foreign for _, item, _, _ in sales),
+            )
+        except HTTPException as e:
+            # e.g. a currency without any lots: reject just its sales
+            errors.extend({"index": index, "detail": e.detail} for index, *_ in sales)
+            continue
+        shares = split_allocations(
+            allocations, [item.amount_foreign for _, item, _, _ in sales]
+        )
+        for (index, item, service, sale_rate), share in zip(sales, shares):
+            report = compute_cost_report(
+                share, item.amount_foreign, sale_rate, service.operation
+            )
+            rows.append(
+                {
+                    "index": index,
+                    "currency_id": currency_id,
+                    "service_id": service.id,
+                    "customer_name": item.customer_name,
+                    "to": item.to,
+                    "number": item.number,
+                    "amount_foreign": item.amount_foreign,
+                    "amount_lyd": report["total_sale"],
+                    "payment_type": item.payment_type,
+                    "profit": report["profit"],
+                    "employee_id": employee.id,
+                    "customer_id": item.customer_id,
+                    "status": TransactionStatus.completed,
+                    "notes": item.notes,
+                }
+            )
+            lot_slices.append(share)
+
+    errors.sort(key=lambda error: error["index"])
+    if not rows:
+        return [], errors
+
+    # Keep the batch's own order in the transactions table.
+    order = sorted(range(len(rows)), key=lambda i: rows[i]["index"])
+    rows = [rows[i] for i in order]
+    lot_slices = [lot_slices[i] for i in order]
+    created_at = datetime.utcnow()
+    references = generate_employee_references(db, employee, len(rows))
+    for row, reference in zip(rows, references):
+        del row["index"]
+        row["reference"] = reference
+        row["created_at"] = created_at
+
+    txn_ids = db.scalars(
+        insert(Transaction).returning(Transaction.id, sort_by_parameter_order=True),
+        rows,
+    ).all()
+    db.execute(
+        insert(TransactionCurrencyLot),
+        [
+            {
+                "transaction_id": txn_id,
+                "lot_id": lot_id,
+                "quantity": qty,
+                "cost_per_unit": unit_cost,
+            }
+            for txn_id, share in zip(txn_ids, lot_slices)
+            for lot_id, qty, unit_cost in share
+        ],
+    )
+
+    cash_total = sum(
+        row["amount_lyd"] for row in rows if row["payment_type"] == PaymentType.cash
+    )
+    customer_totals: Dict[int, float] = defaultdict(float)
+    for row in rows:
+        if row["payment_type"] != PaymentType.cash and row["customer_id"]:
+            customer_totals[row["customer_id"]] += row["amount_lyd"]
+    if cash_total:
+        adjust_employee_balance(db, employee.id, cash_total)
+    for customer_id in sorted(customer_totals):
+        if (
+            adjust_customer_balance(db, customer_id, customer_totals[customer_id])
+            is None
+        ):
+            raise HTTPException(status_code=404, detail="Customer not found")
+
+    sync_transaction_rollup(db, after=[row_rollup_entry(row) for row in rows])
+    db.commit()
+    overview_cache.clear()
+
+    created = (
+        db.query(Transaction)
+        .options(joinedload(Transaction.employee), joinedload(Transaction.customer))
+        .filter(Transaction.id.in_(txn_ids))
+        .order_by(Transaction.id)
+        .all()
+    )
+    logger.info(
+        "Bulk created %d transactions for employee %s (%d rejected)",
+        len(created),
+        employee.id,
+        len(errors),
+    )
+    return created, errors
+
+
 def update_transaction_status(
     db: Session,
     transaction_id: int,
@@ -165,6 +379,7 @@ def update_transaction_status(
         raise HTTPException(status_code=404, detail="Transaction not found")
 
     old_status = txn.status
+    rollup_before = rollup_entry(txn)
     logger.info("[%03d]     Loaded txn #%s with status=%s", call_id, txn.id, old_status)
 
     logger.info("[%03d]     Changing status → %s", call_id, new_status)
@@ -198,11 +413,10 @@ def update_transaction_status(
                 txn.customer_id,
                 original_amount_lyd,
             )
-            customer = db.query(Customer).filter(Customer.id == txn.customer_id).first()
-            if customer:
-                customer.balance_due -= original_amount_lyd
-                db.add(customer)
-            else:
+            if (
+                adjust_customer_balance(db, txn.customer_id, -original_amount_lyd)
+                is None
+            ):
                 logger.warning(
                     "[%03d]     Customer %s not found - skipped balance adjustment",
                     call_id,
@@ -223,8 +437,10 @@ def update_transaction_status(
     logger.info("[%03d]     Creating TransactionStatusLog: %r", call_id, log)
 
     db.add(log)
+    sync_transaction_rollup(db, after=[rollup_entry(txn)], before=[rollup_before])
     logger.info("[%03d]     Committing changes", call_id)
     db.commit()
+    overview_cache.clear()
     logger.info("[%03d]     Commit successful", call_id)
 
     db.refresh(txn)
@@ -242,6 +458,7 @@ def update_transaction(
     txn = db.query(Transaction).filter(Transaction.id == txn_id).first()
     if not txn:
         raise HTTPException(status_code=404, detail="Transaction not found")
+    rollup_before = rollup_entry(txn)
 
     if data.amount_foreign is not None and data.amount_foreign != txn.amount_foreign:
         old_foreign = txn.amount_foreign
@@ -284,10 +501,7 @@ def update_transaction(
             if txn.payment_type == PaymentType.cash:
                 adjust_employee_balance(db, txn.employee_id, extra_sale)
             elif txn.customer_id:
-                c = db.query(Customer).filter(Customer.id == txn.customer_id).first()
-                if c:
-                    c.balance_due += extra_sale
-                    db.add(c)
+                adjust_customer_balance(db, txn.customer_id, extra_sale)
 
             txn.amount_lyd += extra_sale
             txn.profit += extra_profit
@@ -319,7 +533,9 @@ def update_transaction(
 
                 cl = db.get(CurrencyLot, detail.lot_id)
                 if cl:
-                    cl.remaining_quantity += take
+                    # SQL-side increment so a concurrent sale on the same lot
+                    # is not overwritten
+                    cl.remaining_quantity = CurrencyLot.remaining_quantity + take
                     db.add(cl)
 
                 cost_part = round(detail.cost_per_unit * take, 2)
@@ -338,12 +554,7 @@ def update_transaction(
             if txn.payment_type == PaymentType.cash:
                 adjust_employee_balance(db, txn.employee_id, -sale_to_deduct)
             elif txn.customer_id:
-                customer = (
-                    db.query(Customer).filter(Customer.id == txn.customer_id).first()
-                )
-                if customer:
-                    customer.balance_due -= sale_to_deduct
-                    db.add(customer)
+                adjust_customer_balance(db, txn.customer_id, -sale_to_deduct)
 
             txn.amount_lyd -= sale_to_deduct
             txn.profit -= profit_to_deduct
@@ -367,7 +578,9 @@ def update_transaction(
     for field, value in update_data.items():
         setattr(txn, field, value)
 
+    sync_transaction_rollup(db, after=[rollup_entry(txn)], before=[rollup_before])
     db.commit()
+    overview_cache.clear()
     db.refresh(txn)
 
     if status is not None and status != txn.status:
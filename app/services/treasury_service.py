@@ -1,6 +1,10 @@
 from sqlalchemy.orm import Session
 from app.models.treasury import Treasury
 from app.models.transfer import TreasuryTransfer
+from app.services.balance_service import (
+    adjust_treasury_balance,
+    debit_treasury_balance,
+)
 from app.logger import Logger
 
 logger = Logger.get_logger(__name__)
@@ -29,24 +33,24 @@ def adjust_employee_balance(
         "%s▶ adjust_employee_balance(emp=%s, delta=%s)", tag, employee_id, delta
     )
 
-    treasury = db.query(Treasury).filter(Treasury.employee_id == employee_id).first()
-    if not treasury:
-        raise ValueError(f"{tag}Treasury not found for employee {employee_id}")
-
-    old = treasury.balance
-    treasury.balance += delta
-    logger.info("%s   balance: %s → %s", tag, old, treasury.balance)
+    try:
+        balance = adjust_treasury_balance(db, employee_id, delta)
+    except ValueError as e:
+        raise ValueError(f"{tag}{e}")
+    logger.info("%s   balance: %s → %s", tag, balance - delta, balance)
 
 
 def transfer_amount(db: Session, from_id: int, to_id: int, amount: float):
-    from_treasury = db.query(Treasury).filter_by(employee_id=from_id).first()
-    to_treasury = db.query(Treasury).filter_by(employee_id=to_id).first()
-
-    if from_treasury.balance < amount:
-        raise ValueError("Insufficient balance")
-
-    from_treasury.balance -= amount
-    to_treasury.balance += amount
+    if amount <= 0:
+        raise ValueError("Transfer amount must be positive")
+
+    # Touch the two rows in id order so opposite transfers can't deadlock.
+    for employee_id, delta in sorted([(from_id, -amount), (to_id, amount)]):
+        if delta < 0:
+            if debit_treasury_balance(db, employee_id, amount) is None:
+                raise ValueError("Insufficient balance")
+        else:
+            adjust_treasury_balance(db, employee_id, delta)
 
     transfer = TreasuryTransfer(
         from_employee_id=from_id, to_employee_id=to_id, amount=amount